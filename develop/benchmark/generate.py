@@ -0,0 +1,136 @@
+'''
+Synthetic device type library for benchmarks.
+
+    python generate.py /tmp/library --vendors 20 --models 50
+
+writes /tmp/library/device-types/<vendor>/<model>.yaml, the same layout as the
+NetBox Device Type Library. Every 20th model is a large chassis with hundreds of
+interfaces, the rest are switches, servers and PDUs of usual size.
+The output is the same for the same arguments and seed.
+'''
+import argparse
+import os
+import random
+
+
+INTERFACE_TYPES = ('1000base-t', '10gbase-x-sfpp', '25gbase-x-sfp28', '100gbase-x-qsfp28')
+
+
+def get_interfaces(rnd, count):
+    interfaces = []
+    for i in range(count):
+        interfaces.append({
+            'name': f'Ethernet{i // 48 + 1}/{i % 48 + 1}',
+            'type': rnd.choice(INTERFACE_TYPES),
+        })
+    interfaces.append({'name': 'Management1', 'type': '1000base-t', 'mgmt_only': True})
+    return interfaces
+
+
+def get_device_type(rnd, vendor, index):
+    model = f'{vendor} Model {index:04d}'
+    data = {
+        'manufacturer': vendor,
+        'model': model,
+        'slug': model.lower().replace(' ', '-'),
+        'part_number': f'PN-{rnd.randint(10000, 99999)}',
+        'u_height': 1,
+        'is_full_depth': rnd.choice((True, False)),
+        'comments': f'Synthetic device type {index} of {vendor}',
+        'console-ports': [{'name': 'Console', 'type': 'rj-45'}],
+        'power-ports': [
+            {'name': f'PSU{i}', 'type': 'iec-60320-c14', 'maximum_draw': 500, 'allocated_draw': 250}
+            for i in range(1, 3)
+        ],
+    }
+    kind = index % 20
+    if kind == 0:
+        # chassis
+        data.update({'u_height': 14, 'is_full_depth': True})
+        data['interfaces'] = get_interfaces(rnd, rnd.randint(300, 600))
+        data['power-ports'] = [
+            {'name': f'PSU{i}', 'type': 'iec-60320-c20', 'maximum_draw': 3000, 'allocated_draw': 1500}
+            for i in range(1, 7)
+        ]
+    elif kind < 12:
+        # switch
+        data['interfaces'] = get_interfaces(rnd, rnd.choice((24, 48, 52)))
+    elif kind < 18:
+        # server
+        data.update({'u_height': rnd.choice((1, 2)), 'is_full_depth': True})
+        data['interfaces'] = get_interfaces(rnd, rnd.choice((2, 4)))
+    else:
+        # pdu
+        data['power-ports'] = [{'name': 'Input', 'type': 'nema-l6-30p', 'maximum_draw': 5760}]
+        data['power-outlets'] = [
+            {'name': f'Outlet {i}', 'type': 'iec-60320-c13', 'power_port': 'Input'} for i in range(1, 25)
+        ]
+        del data['console-ports']
+    if kind in (1, 2):
+        data['rear-ports'] = [{'name': f'Rear {i}', 'type': '8p8c', 'positions': 1} for i in range(1, 25)]
+        data['front-ports'] = [
+            {'name': f'Front {i}', 'type': '8p8c', 'rear_port': f'Rear {i}', 'rear_port_position': 1}
+            for i in range(1, 25)
+        ]
+    return model, data
+
+
+def dump(value, indent=0):
+    '''
+    YAML in the style of the library files, block style with quoted strings
+    '''
+    pad = '  ' * indent
+    lines = []
+    for key, item in value.items():
+        if isinstance(item, list):
+            lines.append(f'{pad}{key}:')
+            for element in item:
+                first = True
+                for sub_key, sub_item in element.items():
+                    prefix = '  - ' if first else '    '
+                    lines.append(f'{pad}{prefix}{sub_key}: {scalar(sub_item)}')
+                    first = False
+        else:
+            lines.append(f'{pad}{key}: {scalar(item)}')
+    return '\n'.join(lines) + '\n'
+
+
+def scalar(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def generate_library(path, vendors=20, models=50, seed=0):
+    '''
+    Returns the number of written files
+    '''
+    rnd = random.Random(seed)
+    count = 0
+    for v in range(vendors):
+        vendor = f'Vendor{v:03d}'
+        vendor_dir = os.path.join(path, 'device-types', vendor)
+        os.makedirs(vendor_dir, exist_ok=True)
+        for m in range(models):
+            model, data = get_device_type(rnd, vendor, m)
+            with open(os.path.join(vendor_dir, f'{model}.yaml'), 'w') as f:
+                f.write(dump(data))
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic device type library')
+    parser.add_argument('path')
+    parser.add_argument('--vendors', type=int, default=20)
+    parser.add_argument('--models', type=int, default=50, help='Models per vendor')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    count = generate_library(args.path, args.vendors, args.models, args.seed)
+    print(f'{count} files written to {args.path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+'''
+Benchmark of Load and Import against a synthetic library served by the fake GraphQL server.
+
+    python run.py --netbox /opt/netbox/netbox --sizes 1000 5000 20000
+
+For every size a library is generated, Load runs on an empty table, then again on the
+unchanged library, then all loaded device types are imported. Wall time, DB queries,
+peak Python memory (tracemalloc, the parse workers are not included) and the requests
+and bytes served by the fake API are reported.
+Everything runs in a transaction which is rolled back, the database is left as it was.
+'''
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+
+from generate import generate_library
+from server import serve, setup_django
+
+
+MODELS_PER_VENDOR = 50
+
+
+class QueryCounter():
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(name, func, fake, memory=True):
+    from django.db import connection
+
+    counter = QueryCounter()
+    fake.reset_stats()
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        result = func()
+    elapsed = time.perf_counter() - started
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        'scenario': name,
+        'seconds': round(elapsed, 3),
+        'queries': counter.count,
+        'peak_mb': round(peak / 2 ** 20, 1),
+        'requests': fake.stats['requests'],
+        'kbytes': round(fake.stats['bytes'] / 2 ** 10),
+        'result': result,
+    }
+
+
+def run_size(size, args):
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+
+    from netbox_devicetype_importer.importer import MetaDeviceTypeImporter
+    from netbox_devicetype_importer.models import MetaDeviceType, MetaDeviceTypeTree
+    from netbox_devicetype_importer.sync import MetaDeviceTypeSync
+    from netbox_devicetype_importer.utilities import GitHubGQLAPI
+
+    results = []
+    with tempfile.TemporaryDirectory() as path:
+        vendors = max(1, size // MODELS_PER_VENDOR)
+        generate_library(path, vendors=vendors, models=min(size, MODELS_PER_VENDOR), seed=args.seed)
+        server, fake = serve(path)
+        url = f'http://127.0.0.1:{server.server_port}/graphql'
+        try:
+            with transaction.atomic():
+                MetaDeviceType.objects.all().delete()
+                MetaDeviceTypeTree.objects.all().delete()
+                user = get_user_model().objects.create(username='devicetype-benchmark', is_superuser=True)
+
+                def get_api():
+                    return GitHubGQLAPI(
+                        url=url, token='benchmark', owner='benchmark', repo='library',
+                        chunk_size=args.chunk_size, max_workers=args.workers
+                    )
+
+                results.append(measure(
+                    'load', lambda: MetaDeviceTypeSync().sync_repo(get_api()), fake, args.memory
+                ))
+                results.append(measure(
+                    'load unchanged', lambda: MetaDeviceTypeSync().sync_repo(get_api()), fake, args.memory
+                ))
+                pk_list = list(MetaDeviceType.objects.order_by('pk').values_list('pk', flat=True))
+                if args.import_limit is not None:
+                    pk_list = pk_list[:args.import_limit]
+
+                def import_types():
+                    importer = MetaDeviceTypeImporter(get_api(), user, parse_workers=args.workers)
+                    result = importer.import_types(pk_list)
+                    return {'imported': len(result['imported']), 'errored': result['errored']}
+
+                if pk_list:
+                    results.append(measure(f'import {len(pk_list)}', import_types, fake, args.memory))
+                transaction.set_rollback(True)
+        finally:
+            server.shutdown()
+    for result in results:
+        result['size'] = size
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Load and Import')
+    parser.add_argument('--netbox', default='/opt/netbox/netbox', help='Directory of the NetBox manage.py')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000], help='Number of files')
+    parser.add_argument('--import-limit', type=int, help='Import only the first N device types')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent requests and parse workers')
+    parser.add_argument('--chunk-size', type=int, default=100, help='Files per GraphQL query')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='Do not trace memory')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    setup_django(args.netbox)
+
+    results = []
+    for size in args.sizes:
+        for result in run_size(size, args):
+            results.append(result)
+            if not args.json:
+                print(
+                    '{size:>6} {scenario:<16} {seconds:>9.2f}s {queries:>8} queries {peak_mb:>8} MB '
+                    '{requests:>6} requests {kbytes:>8} KB  {result}'.format(**result),
+                    flush=True
+                )
+    if args.json:
+        print(json.dumps(results, default=str))
+
+
+if __name__ == '__main__':
+    main()
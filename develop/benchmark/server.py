@@ -0,0 +1,192 @@
+'''
+Local stand-in for the GitHub GraphQL API, it answers the queries of GitHubGQLAPI
+from a library directory written by generate.py (or a devicetype-library checkout).
+
+    python server.py /tmp/library --port 8081 --netbox /opt/netbox/netbox
+
+then set the url of GitHubGQLAPI to http://127.0.0.1:8081/graphql.
+Queries are recognized by their aliases and object expressions, it is not a GraphQL parser.
+'''
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+EXPRESSION_RE = re.compile(r'(?:(\w+):\s*)?object\(expression:\s*"([^"]*)"\)')
+
+
+def setup_django(netbox_path):
+    '''
+    The plugin can be imported only after this, it needs NetBox on sys.path and Django set up
+    '''
+    sys.path.insert(0, netbox_path)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'netbox.settings')
+    import django
+    django.setup()
+
+
+class Library():
+    '''
+    Files of the library in memory with git oids
+    vendors = {'vendor': {'oid': '', 'files': {'model.yaml': {'oid': '', 'text': ''}}}}
+    '''
+    root_path = 'device-types'
+
+    def __init__(self, path):
+        from netbox_devicetype_importer.utilities import git_blob_sha, git_tree_sha
+
+        self.vendors = {}
+        root = os.path.join(path, self.root_path)
+        for vendor in sorted(os.listdir(root)):
+            vendor_dir = os.path.join(root, vendor)
+            if not os.path.isdir(vendor_dir):
+                continue
+            files = {}
+            for name in sorted(os.listdir(vendor_dir)):
+                with open(os.path.join(vendor_dir, name), 'rb') as f:
+                    data = f.read()
+                files[name] = {'oid': git_blob_sha(data), 'text': data.decode('utf-8')}
+            oid = git_tree_sha({name: ('100644', item['oid']) for name, item in files.items()})
+            self.vendors[vendor] = {'oid': oid, 'files': files}
+        self.oid = git_tree_sha({vendor: ('40000', item['oid']) for vendor, item in self.vendors.items()})
+        # not a real commit object, any stable oid does for pinning
+        self.commit = hashlib.sha1(f'commit {self.oid}'.encode()).hexdigest()
+
+    def get(self, path):
+        '''
+        returns ('tree', vendor) or ('blob', file), None if there is no such path
+        '''
+        parts = path.strip('/').split('/')
+        if parts[0] != self.root_path:
+            return None
+        if len(parts) == 1:
+            return 'root', None
+        vendor = self.vendors.get(parts[1])
+        if vendor is None:
+            return None
+        if len(parts) == 2:
+            return 'tree', vendor
+        item = vendor['files'].get('/'.join(parts[2:]))
+        return ('blob', item) if item is not None else None
+
+
+class FakeGitHub():
+    def __init__(self, library):
+        self.library = library
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'bytes': 0, 'cost': 0}
+
+    def vendor_entries(self, vendor, nested=False):
+        entries = []
+        for name, item in vendor['files'].items():
+            entry = {'name': name, 'type': 'blob'}
+            if nested:
+                entry['object'] = {'oid': item['oid']}
+            else:
+                entry['oid'] = item['oid']
+            entries.append(entry)
+        return entries
+
+    def answer(self, query):
+        expressions = EXPRESSION_RE.findall(query)
+        repository = {}
+        for alias, expression in expressions:
+            if ':' not in expression:
+                # the branch is resolved to a commit
+                repository['object'] = {'oid': self.library.commit}
+                continue
+            path = expression.split(':', 1)[1]
+            found = self.library.get(path)
+            if alias:
+                if found is None:
+                    repository[alias] = None
+                elif found[0] == 'blob':
+                    repository[alias] = {'oid': found[1]['oid'], 'text': found[1]['text']}
+                else:
+                    repository[alias] = {'entries': self.vendor_entries(found[1])}
+            elif 'text' not in query and 'object {' in query:
+                # whole tree in one query
+                repository['object'] = {'entries': [
+                    {'name': name, 'type': 'tree', 'object': {'entries': self.vendor_entries(vendor, nested=True)}}
+                    for name, vendor in self.library.vendors.items()
+                ]}
+            else:
+                repository['object'] = {
+                    'oid': self.library.oid,
+                    'entries': [
+                        {'name': name, 'type': 'tree', 'oid': vendor['oid']}
+                        for name, vendor in self.library.vendors.items()
+                    ],
+                }
+        cost = 1
+        return {'data': {'rateLimit': {'cost': cost, 'remaining': 5000, 'resetAt': ''}, 'repository': repository}}
+
+    def count(self, size, cost):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += size
+            self.stats['cost'] += cost
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'bytes': 0, 'cost': 0}
+
+
+def get_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            query = json.loads(self.rfile.read(length))['query']
+            result = fake.answer(query)
+            body = json.dumps(result).encode()
+            fake.count(len(body), result['data']['rateLimit']['cost'])
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('X-RateLimit-Remaining', '5000')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(library_path, host='127.0.0.1', port=0):
+    '''
+    Start the server in a thread, returns (server, fake), the url is
+    f'http://{host}:{server.server_port}/graphql'
+    '''
+    fake = FakeGitHub(Library(library_path))
+    server = ThreadingHTTPServer((host, port), get_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake GitHub GraphQL API for benchmarks')
+    parser.add_argument('path', help='Library directory')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--netbox', default='/opt/netbox/netbox', help='Directory of the NetBox manage.py')
+    args = parser.parse_args()
+    setup_django(args.netbox)
+    server, fake = serve(args.path, args.host, args.port)
+    print(f'Serving {args.path} on http://{args.host}:{server.server_port}/graphql')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 from extras.plugins import PluginConfig
 from .version import __version__
 
@@ -17,7 +20,28 @@ class NetboxdevicetypeimporterConfig(PluginConfig):
         'repo': 'devicetype-library',
         'github_token': '',
         'use_gql': True,
+        'repo_path': '',
+        'repo_ref': 'HEAD',
+        'repo_branch': 'master',
+        'repo_archive': '',
+        'archive_threshold': 1000,
+        'background_jobs': True,
+        'job_timeout': 3600,
+        'files_chunk_size': 100,
+        'max_workers': 4,
+        'retries': 2,
+        'rest_cache_dir': os.path.join(tempfile.gettempdir(), 'netbox_devicetype_importer'),
+        'blob_cache': True,
+        'blob_cache_compress': True,
+        'prefetch_blobs': False,
+        'parse_workers': None,
+        'manufacturer_aliases': {},
+        'import_transforms': [],
     }
 
+    def ready(self):
+        super().ready()
+        from . import signals  # noqa: F401
+
 
 config = NetboxdevicetypeimporterConfig # noqa
@@ -1,12 +1,33 @@
-"""
-from rest_framework.serializers import ModelSerializer
+from django.urls import reverse
 
-from netbox_devicetype_importer.models import MyModel1
+from rest_framework import serializers
 
+from netbox_devicetype_importer.models import MetaDeviceType
 
-class MyModel1Serializer(ModelSerializer):
+
+class MetaDeviceTypeSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(
+        view_name='plugins-api:netbox_devicetype_importer-api:metadevicetype-detail'
+    )
 
     class Meta:
-        model = MyModel1
-        fields = '__all__'
-"""
+        model = MetaDeviceType
+        fields = [
+            'id', 'url', 'vendor', 'name', 'sha', 'commit', 'is_new', 'is_imported', 'imported_dt', 'imported_sha',
+        ]
+
+
+class JobSerializer(serializers.Serializer):
+    '''
+    Job started by the load and import actions, the url points to the JobResult in the NetBox API
+    '''
+    id = serializers.IntegerField(source='pk')
+    job_id = serializers.UUIDField()
+    name = serializers.CharField()
+    status = serializers.CharField()
+    url = serializers.SerializerMethodField()
+
+    def get_url(self, obj):
+        return self.context['request'].build_absolute_uri(
+            reverse('extras-api:jobresult-detail', kwargs={'pk': obj.pk})
+        )
@@ -1,10 +1,7 @@
-"""
 from rest_framework import routers
-from .views import MyModel1ViewSet
+from .views import MetaDeviceTypeViewSet
 
 
 router = routers.DefaultRouter()
-router.register('', MyModel1ViewSet)
+router.register('meta-device-types', MetaDeviceTypeViewSet)
 urlpatterns = router.urls
-
-"""
@@ -1,10 +1,88 @@
-"""
-from rest_framework.viewsets import ModelViewSet
-from netbox_devicetype_importer.models import MyModel1
-from .serializers import MyModel1Serializer
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from utilities.utils import copy_safe_request
 
-class MyModel1ViewSet(ModelViewSet):
-    queryset = MyModel1.objects.all()
-    serializer_class = MyModel1Serializer
-"""
+from netbox_devicetype_importer.filters import MetaDeviceTypeFilterSet
+from netbox_devicetype_importer.importer import MetaDeviceTypeImporter
+from netbox_devicetype_importer.jobs import enqueue_job, import_job, load_job
+from netbox_devicetype_importer.models import MetaDeviceType
+from .serializers import JobSerializer, MetaDeviceTypeSerializer
+
+
+class MetaDeviceTypePagination(CursorPagination):
+    ordering = 'pk'
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+
+class MetaDeviceTypeViewSet(ReadOnlyModelViewSet):
+    queryset = MetaDeviceType.objects.all()
+    serializer_class = MetaDeviceTypeSerializer
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = MetaDeviceTypeFilterSet
+    pagination_class = MetaDeviceTypePagination
+
+    def get_queryset(self):
+        return self.queryset.restrict(self.request.user, 'view')
+
+    def check_add_permission(self, request):
+        if not request.user.has_perm('netbox_devicetype_importer.add_metadevicetype'):
+            raise PermissionDenied()
+
+    def get_job_response(self, job_result):
+        serializer = JobSerializer(job_result, context={'request': self.request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'])
+    def load(self, request):
+        '''
+        Start a Load job, {"full": true} loads all vendors
+        '''
+        self.check_add_permission(request)
+        job_result = enqueue_job(
+            load_job, 'Load', request.user, request=copy_safe_request(request), full=bool(request.data.get('full'))
+        )
+        return self.get_job_response(job_result)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_types(self, request):
+        '''
+        Start an Import job for {"pk": [1, 2]}, or for {"all": true} and the filters in the query string,
+        with {"dry_run": true} nothing is imported and the job result has the diff,
+        with {"update": true} changed files are applied to device types which are already imported
+        '''
+        self.check_add_permission(request)
+        if request.data.get('all'):
+            pk_list = list(self.filter_queryset(self.get_queryset()).values_list('pk', flat=True))
+        else:
+            try:
+                pk_list = [int(pk) for pk in request.data.get('pk', [])]
+            except (TypeError, ValueError):
+                raise ValidationError({'pk': 'A list of MetaDeviceType IDs is expected'})
+        if not pk_list:
+            raise ValidationError('Nothing to import')
+        dry_run = bool(request.data.get('dry_run'))
+        update = bool(request.data.get('update'))
+        if update and not request.user.has_perms(MetaDeviceTypeImporter.get_update_permissions()):
+            raise PermissionDenied()
+        if update:
+            name = 'Update'
+        else:
+            name = 'Import (dry run)' if dry_run else 'Import'
+        job_result = enqueue_job(
+            import_job,
+            name,
+            request.user,
+            request=copy_safe_request(request),
+            pk_list=pk_list,
+            dry_run=dry_run and not update,
+            update=update,
+        )
+        return self.get_job_response(job_result)
@@ -0,0 +1,60 @@
+import zlib
+
+from .models import MetaDeviceTypeBlob
+from .utilities import git_blob_sha
+
+
+class BlobCache():
+    '''
+    Device type files cached in the DB by git blob sha.
+    A blob never changes for a given sha, so cached files never expire.
+    '''
+    batch_size = 500
+
+    def __init__(self, compress=True):
+        self.compress = compress
+
+    def get_many(self, shas):
+        '''
+        result = {'sha': 'yaml_text'}
+        '''
+        result = {}
+        shas = list(shas)
+        for i in range(0, len(shas), self.batch_size):
+            blobs = MetaDeviceTypeBlob.objects.filter(sha__in=shas[i:i + self.batch_size])
+            for sha, data, compressed in blobs.values_list('sha', 'data', 'compressed'):
+                data = bytes(data)
+                if compressed:
+                    data = zlib.decompress(data)
+                result[sha] = data.decode('utf-8')
+        return result
+
+    def set_many(self, files):
+        '''
+        files = {'sha': 'yaml_text'}
+        Files whose content does not match the sha are not stored, a file fetched by path may have changed.
+        '''
+        blobs = []
+        for sha, text in files.items():
+            data = text.encode('utf-8')
+            if git_blob_sha(data) != sha:
+                continue
+            if self.compress:
+                data = zlib.compress(data)
+            blobs.append(MetaDeviceTypeBlob(sha=sha, data=data, compressed=self.compress))
+        # the same sha can be stored by another job in the meantime
+        MetaDeviceTypeBlob.objects.bulk_create(blobs, batch_size=self.batch_size, ignore_conflicts=True)
+
+    def get_files(self, gh_api, query_data, ref=None):
+        '''
+        Same as gh_api.get_files, but only files missing in the cache are fetched
+        query_data = {'sha': 'vendor/model'}
+        result = {'sha': 'yaml_text'}
+        '''
+        result = self.get_many(query_data.keys())
+        missing = {sha: path for sha, path in query_data.items() if sha not in result}
+        if missing:
+            fetched = gh_api.get_files(missing, ref=ref)
+            self.set_many(fetched)
+            result.update(fetched)
+        return result
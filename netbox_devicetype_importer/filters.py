@@ -6,6 +6,7 @@ from .models import MetaDeviceType
 
 
 class MetaDeviceTypeFilterSet(django_filters.FilterSet):
+    # icontains lookups are served by trigram indexes on PostgreSQL, see migration 0009
     q = django_filters.CharFilter(
         method='search',
         label='Search',
@@ -23,13 +24,13 @@ class MetaDeviceTypeFilterSet(django_filters.FilterSet):
 
     class Meta:
         model = MetaDeviceType
-        fields = ['name', 'vendor']
+        fields = ['name', 'vendor', 'is_new', 'is_imported']
 
     def by_model(self, queryset, name, value):
         if not value.strip():
             return queryset
 
-        return queryset.filter(Q(name__icontains=value))
+        return queryset.filter(Q(name__icontains=value.strip()))
 
     def by_vendor(self, queryset, name, value):
         if not value.strip():
@@ -37,15 +38,16 @@ class MetaDeviceTypeFilterSet(django_filters.FilterSet):
         if ',' in value:
             q = Q()
             for _ in value.split(','):
-                if _:
-                    q |= Q(vendor__icontains=_)
+                if _.strip():
+                    q |= Q(vendor__icontains=_.strip())
             return queryset.filter(q)
-        return queryset.filter(Q(vendor__icontains=value))
+        return queryset.filter(Q(vendor__icontains=value.strip()))
 
     def search(self, queryset, name, value):
         if not value.strip():
             return queryset
 
+        value = value.strip()
         qs_filter = (
             Q(name__icontains=value) | Q(vendor__icontains=value)
         )
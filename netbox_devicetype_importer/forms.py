@@ -1,6 +1,6 @@
 from django import forms
 
-from utilities.forms import BootstrapMixin
+from utilities.forms import BOOLEAN_WITH_BLANK_CHOICES, BootstrapMixin, StaticSelect
 
 from .models import MetaDeviceType
 
@@ -19,7 +19,17 @@ class MetaDeviceTypeFilterForm(BootstrapMixin, forms.Form):
         required=False,
         label='Vendor'
     )
+    is_new = forms.NullBooleanField(
+        required=False,
+        label='New or changed',
+        widget=StaticSelect(choices=BOOLEAN_WITH_BLANK_CHOICES)
+    )
+    is_imported = forms.NullBooleanField(
+        required=False,
+        label='Imported',
+        widget=StaticSelect(choices=BOOLEAN_WITH_BLANK_CHOICES)
+    )
 
     class Meta:
         model = MetaDeviceType
-        fields = ['q', 'name', 'vendor']
+        fields = ['q', 'name', 'vendor', 'is_new', 'is_imported']
@@ -0,0 +1,677 @@
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+from django.utils.text import slugify
+from mptt.models import MPTTModel
+
+from dcim.models import Manufacturer, DeviceType
+from dcim import forms
+from extras.choices import LogLevelChoices
+from utilities.forms import restrict_form_fields
+from utilities.exceptions import AbortTransaction, PermissionsViolation
+
+from . import metrics
+from .manufacturers import ManufacturerResolver
+from .models import MetaDeviceType, MetaDeviceTypeImportResult
+from .parsers import REQUIRED_FIELDS, parse_device_type
+from .progress import JobProgress
+from .signals import log_created, skip_linking
+
+
+class MetaDeviceTypeImporter():
+    batch_size = 500
+    # smaller imports are parsed in-process
+    parse_pool_threshold = 50
+    # seconds between writes of import results
+    results_interval = 1
+    related_object_forms = OrderedDict((
+        ('console-ports', forms.ConsolePortTemplateImportForm),
+        ('console-server-ports', forms.ConsoleServerPortTemplateImportForm),
+        ('power-ports', forms.PowerPortTemplateImportForm),
+        ('power-outlets', forms.PowerOutletTemplateImportForm),
+        ('interfaces', forms.InterfaceTemplateImportForm),
+        ('rear-ports', forms.RearPortTemplateImportForm),
+        ('front-ports', forms.FrontPortTemplateImportForm),
+        ('device-bays', forms.DeviceBayTemplateImportForm),
+    ))
+
+    def __init__(self, gh_api, user, progress=None, blob_cache=None, parse_workers=None, job_id=None,
+                 manufacturer_aliases=None, transforms=None):
+        self.gh_api = gh_api
+        # dotted paths from import_transforms, or callables
+        self.transforms = [
+            import_string(transform) if isinstance(transform, str) else transform for transform in transforms or ()
+        ]
+        self.manufacturer_aliases = manufacturer_aliases
+        # time of validation and DB writes, they alternate for every device type
+        self.timer = metrics.PhaseTimer()
+        self.resolver = None
+        self.job_id = job_id
+        self.results = []
+        self.results_saved = time.monotonic()
+        self.blob_cache = blob_cache
+        self.parse_workers = parse_workers
+        self.user = user
+        self.progress = progress or JobProgress()
+        self.version_minor = int(settings.VERSION.split('.')[1])
+        self.related_object_forms = self.get_related_object_forms()
+
+    @classmethod
+    def get_related_object_forms(cls):
+        related_object_forms = OrderedDict(cls.related_object_forms)
+        # for 3.2 new devicetype components
+        if int(settings.VERSION.split('.')[1]) >= 2:
+            related_object_forms.popitem()
+            related_object_forms.update(
+                {
+                    'module-bays': forms.ModuleBayTemplateImportForm,
+                    'device-bays': forms.DeviceBayTemplateImportForm,
+                    'inventory-items': forms.InventoryItemTemplateImportForm
+                }
+            )
+        return related_object_forms
+
+    @classmethod
+    def get_update_permissions(cls):
+        '''
+        Permissions update_types needs besides add_metadevicetype: it changes device types,
+        and adds, changes and deletes their components
+        '''
+        permissions = ['dcim.change_devicetype']
+        for related_object_form in cls.get_related_object_forms().values():
+            meta = related_object_form._meta.model._meta
+            for action in ('add', 'change', 'delete'):
+                permissions.append(f'{meta.app_label}.{action}_{meta.model_name}')
+        return permissions
+
+    def import_types(self, pk_list):
+        '''
+        result = {'imported': [devicetype_pk], 'errored': 0, 'manufacturers': 0}
+        '''
+        errored = 0
+        imported_dt = []
+        result = {'imported': imported_dt, 'errored': errored, 'manufacturers': 0}
+
+        metadevicetypes, query_data, dt_files = self.fetch_files(
+            MetaDeviceType.objects.filter(pk__in=pk_list, is_imported=False)
+        )
+        if not query_data:
+            return result
+        for sha in query_data:
+            if sha not in dt_files:
+                errored += 1
+                self.add_result(metadevicetypes[sha], errors=['Can not fetch the file'], reason='fetch')
+
+        resolver = self.get_resolver()
+        resolver.create_missing({item['vendor'] for item in metadevicetypes.values()})
+
+        links = []
+        self.progress.start('parse', total=len(dt_files))
+        self.progress.start('save', total=len(dt_files))
+        # links of device types which are saved already must not be lost if the job fails
+        try:
+            for sha, data, error in self.parse_documents(dt_files):
+                self.progress.advance('parse')
+                started = time.monotonic()
+                if data is not None:
+                    # manufacturer of the file may differ from the vendor directory
+                    resolver.create_missing([data['manufacturer']])
+                    resolver.resolve(data)
+                    obj, errors = self.import_type(data)
+                    if obj is None:
+                        errored += 1
+                    else:
+                        imported_dt.append(obj.pk)
+                        # same fields as MetaDeviceType.save() sets for an imported device type
+                        links.append(MetaDeviceType(
+                            pk=metadevicetypes[sha]['pk'],
+                            imported_dt=obj,
+                            imported_sha=sha,
+                            is_imported=True,
+                            is_new=False,
+                        ))
+                        if len(links) >= self.batch_size:
+                            self.save_links(links)
+                            links = []
+                else:
+                    obj, errors = None, [error]
+                    errored += 1
+                    self.progress.message(LogLevelChoices.LOG_FAILURE, f'{query_data[sha]}: {error}')
+                self.add_result(
+                    metadevicetypes[sha],
+                    imported_dt=obj.pk if obj is not None else None,
+                    duration=time.monotonic() - started,
+                    errors=errors,
+                    reason='validation' if data is not None else 'parse',
+                )
+                self.progress.advance('save')
+        finally:
+            self.save_links(links)
+            self.save_results()
+        self.progress.finish('parse')
+        self.progress.finish('save')
+        result.update({'errored': errored, 'manufacturers': resolver.created})
+        self.report(device_types=len(imported_dt), manufacturers=resolver.created, errored=errored)
+        return result
+
+    def get_resolver(self):
+        if self.resolver is None:
+            self.resolver = ManufacturerResolver(aliases=self.manufacturer_aliases)
+        return self.resolver
+
+    def save_links(self, links):
+        if links:
+            MetaDeviceType.objects.bulk_update(
+                links, ['imported_dt', 'imported_sha', 'is_imported', 'is_new'], batch_size=self.batch_size
+            )
+
+    def fetch_files(self, queryset):
+        '''
+        Fetch files of MetaDeviceType rows in queryset
+        returns (metadevicetypes, query_data, dt_files)
+        metadevicetypes = {'sha': {'pk': 1, 'vendor': '', 'name': '', 'imported_dt': None}}
+        query_data = {'sha': 'vendor/model'}
+        dt_files = {'sha': 'yaml_text'}
+        Files are fetched from the commit every row was loaded from.
+        '''
+        query_data = {}
+        metadevicetypes = {}
+        commits = {}
+        fields = ('pk', 'vendor', 'name', 'sha', 'commit', 'imported_dt')
+        for pk, vendor, name, sha, commit, imported_dt in queryset.values_list(*fields):
+            query_data[sha] = f'{vendor}/{name}'
+            commits.setdefault(commit, {})[sha] = query_data[sha]
+            metadevicetypes[sha] = {'pk': pk, 'vendor': vendor, 'name': name, 'imported_dt': imported_dt}
+        if not query_data:
+            return metadevicetypes, query_data, {}
+
+        self.progress.start('files', total=len(query_data))
+        dt_files = {}
+        for commit, commit_data in commits.items():
+            # rows without a commit were loaded before commits were saved, they are read from the branch
+            if self.blob_cache is not None:
+                dt_files.update(self.blob_cache.get_files(self.gh_api, commit_data, ref=commit or None))
+            else:
+                dt_files.update(self.gh_api.get_files(commit_data, ref=commit or None))
+            self.progress.advance('files', len(commit_data))
+        self.progress.finish('files')
+        missing = len(query_data) - len(dt_files)
+        if missing:
+            self.progress.message(LogLevelChoices.LOG_WARNING, f'Can not fetch {missing} files')
+        return metadevicetypes, query_data, dt_files
+
+    def diff_types(self, pk_list):
+        '''
+        Dry run of import_types, files are fetched, parsed and validated, nothing is saved
+        diff = {
+            'create': [{'pk': 1, 'vendor': '', 'name': '', 'manufacturer': '', 'model': ''}],
+            'exists': [{..., 'device_type': devicetype_pk}],
+            'invalid': [{..., 'errors': ['']}],
+            'manufacturers': ['vendor'],
+        }
+        Every device type is validated in its own transaction, which is rolled back.
+        '''
+        diff = {'create': [], 'exists': [], 'invalid': [], 'manufacturers': []}
+        metadevicetypes, query_data, dt_files = self.fetch_files(
+            MetaDeviceType.objects.filter(pk__in=pk_list, is_imported=False)
+        )
+        for sha in query_data:
+            if sha not in dt_files:
+                diff['invalid'].append(dict(metadevicetypes[sha], errors=['Can not fetch the file']))
+        if not dt_files:
+            return diff
+
+        self.progress.start('parse', total=len(dt_files))
+        parsed = []
+        for sha, data, error in self.parse_documents(dt_files):
+            self.progress.advance('parse')
+            if data is None:
+                diff['invalid'].append(dict(metadevicetypes[sha], errors=[error]))
+            else:
+                parsed.append((sha, data))
+        self.progress.finish('parse')
+
+        resolver = self.get_resolver()
+        vendors = {item['vendor'] for item in metadevicetypes.values()}
+        vendors.update(data['manufacturer'] for sha, data in parsed)
+        diff['manufacturers'] = sorted(resolver.get_missing(vendors).values())
+        # one query for all (manufacturer, model) pairs which are already in NetBox
+        existing = {
+            (manufacturer, model): pk for pk, manufacturer, model in DeviceType.objects.filter(
+                model__in={str(data['model']) for sha, data in parsed}
+            ).values_list('pk', 'manufacturer_id', 'model')
+        }
+
+        self.progress.start('save', total=len(parsed))
+        for sha, data in parsed:
+            item = dict(metadevicetypes[sha], manufacturer=data['manufacturer'], model=data['model'])
+            manufacturer = resolver.resolve(data)
+            device_type = None
+            if manufacturer is not None:
+                device_type = existing.get((manufacturer.pk, str(data['model'])))
+            if device_type is not None:
+                diff['exists'].append(dict(item, device_type=device_type))
+            else:
+                errors = self.validate_type(data)
+                if errors:
+                    diff['invalid'].append(dict(item, errors=errors))
+                else:
+                    diff['create'].append(item)
+            self.progress.advance('save')
+        self.progress.finish('save')
+        self.timer.observe(self.progress.operation)
+        return diff
+
+    def validate_type(self, data):
+        '''
+        Run import_type in a transaction which is always rolled back, returns errors
+        '''
+        try:
+            with transaction.atomic():
+                if self.get_resolver().get(data['manufacturer']) is None:
+                    name = self.get_resolver().get_name(data['manufacturer'])
+                    Manufacturer.objects.create(name=name, slug=slugify(name))
+                    data['manufacturer'] = name
+                obj, errors = self.import_type(data)
+                transaction.set_rollback(True)
+        except IntegrityError as e:
+            return [f'Database error: {e}']
+        return errors
+
+    def report(self, errored=0, **counts):
+        '''
+        Rows to metrics, validation and write times of all device types, and a summary log record
+        '''
+        operation = self.progress.operation
+        metrics.add_rows(operation, **counts)
+        self.timer.observe(operation)
+        metrics.log_event('summary', operation=operation, errored=errored, **counts)
+
+    def add_result(self, metadevicetype, imported_dt=None, duration=0, errors=None, reason='validation'):
+        '''
+        reason of a failure is a metrics label: fetch, parse, validation or missing_device_type
+        '''
+        if imported_dt is None:
+            metrics.add_failure(self.progress.operation, reason)
+        else:
+            metrics.device_type_duration.labels(operation=self.progress.operation).observe(duration)
+        self.progress.item(
+            vendor=metadevicetype['vendor'],
+            name=metadevicetype['name'],
+            success=imported_dt is not None,
+            imported_dt=imported_dt,
+            duration=round(duration, 3),
+            errors=errors or [],
+        )
+        if self.job_id is None:
+            return
+        self.results.append(
+            MetaDeviceTypeImportResult(
+                job_id=self.job_id,
+                metadevicetype_id=metadevicetype['pk'],
+                vendor=metadevicetype['vendor'],
+                name=metadevicetype['name'],
+                success=imported_dt is not None,
+                imported_dt=imported_dt,
+                duration=duration,
+                errors=errors or [],
+            )
+        )
+        if time.monotonic() - self.results_saved >= self.results_interval:
+            self.save_results()
+
+    def save_results(self):
+        if self.results:
+            MetaDeviceTypeImportResult.objects.bulk_create(self.results, batch_size=self.batch_size)
+        self.results = []
+        self.results_saved = time.monotonic()
+
+    def parse_files(self, dt_files):
+        '''
+        Parse files in a process pool, results are yielded in order as soon as they are ready,
+        so saving does not wait for all files to be parsed
+        '''
+        items = list(dt_files.items())
+        if self.parse_workers == 1 or len(items) < self.parse_pool_threshold:
+            yield from map(parse_device_type, items)
+            return
+        # forked workers only parse, they do not need to set up Django again
+        mp_context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=mp_context) as executor:
+            yield from executor.map(parse_device_type, items, chunksize=10)
+
+    def get_model_form(self, data, instance=None):
+        model_form = forms.DeviceTypeImportForm(data, instance=instance)
+        # is it nessescary?
+        restrict_form_fields(model_form, self.user)
+
+        for field_name, field in model_form.fields.items():
+            if field_name not in data and hasattr(field, 'initial'):
+                model_form.data[field_name] = field.initial
+        return model_form
+
+    def get_component_form(self, related_object_form, device_type, data, instance=None):
+        if self.version_minor >= 2:
+            data.update({'device_type': device_type})
+            f = related_object_form(data, instance=instance)
+        else:
+            f = related_object_form(device_type, data, instance=instance)
+        for subfield_name, field in f.fields.items():
+            if subfield_name not in data and hasattr(field, 'initial'):
+                f.data[subfield_name] = field.initial
+        return f
+
+    @staticmethod
+    def add_component_errors(model_form, field_name, i, f):
+        for subfield_name, errors in f.errors.items():
+            for err in errors:
+                err_msg = "{}[{}] {}: {}".format(field_name, i, subfield_name, err)
+                model_form.add_error(None, err_msg)
+
+    @staticmethod
+    def get_unique_keys(model):
+        '''
+        Unique fields of components of one device type, as attnames: [('name',), ('rear_port_id', 'rear_port_position')]
+        '''
+        keys = []
+        constraints = [
+            constraint.fields for constraint in model._meta.constraints
+            if getattr(constraint, 'fields', None) and getattr(constraint, 'condition', None) is None
+        ]
+        for fields in [*model._meta.unique_together, *constraints]:
+            key = tuple(
+                model._meta.get_field(field).attname for field in fields if field not in ('device_type', 'module_type')
+            )
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+
+    @staticmethod
+    def check_unique(model_form, field_name, i, obj, unique_keys, seen):
+        '''
+        Form validation checks uniqueness only against the DB, components saved in bulk are checked here.
+        seen = {('name',): {('value',)}}
+        '''
+        for key in unique_keys:
+            value = tuple(getattr(obj, attname) for attname in key)
+            if value in seen.setdefault(key, set()):
+                fields = ', '.join(attname[:-3] if attname.endswith('_id') else attname for attname in key)
+                model_form.add_error(None, '{}[{}] {}: Duplicate {} "{}"'.format(
+                    field_name, i, fields, fields, ', '.join(str(item) for item in value)
+                ))
+            seen[key].add(value)
+
+    @staticmethod
+    def get_values(instance):
+        '''
+        Field values of instance, forms set them on the instance during validation
+        '''
+        return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+    @staticmethod
+    def get_errors(model_form):
+        errors = []
+        for field_name, field_errors in model_form.errors.items():
+            for err in field_errors:
+                errors.append(err if field_name == '__all__' else f'{field_name}: {err}')
+        return errors
+
+    def timed(self, phase, iterator):
+        '''
+        Add the time spent waiting for items of iterator to phase
+        '''
+        iterator = iter(iterator)
+        while True:
+            with self.timer(phase):
+                item = next(iterator, None)
+            if item is None:
+                return
+            yield item
+
+    def parse_documents(self, dt_files):
+        '''
+        parse_files with transforms applied to the parsed documents.
+        A transform gets the list of all documents and changes them in place or returns a new list
+        of the same length, None in the list skips the document.
+        With transforms all files are parsed before the first one is saved.
+        '''
+        if not self.transforms:
+            yield from self.timed('parse_wait', self.parse_files(dt_files))
+            return
+        parsed = list(self.timed('parse_wait', self.parse_files(dt_files)))
+        shas = [sha for sha, data, error in parsed if data is not None]
+        documents = [data for sha, data, error in parsed if data is not None]
+        for transform in self.transforms:
+            with self.timer('transform'):
+                transformed = transform(documents)
+            if transformed is not None:
+                transformed = list(transformed)
+                if len(transformed) != len(documents):
+                    raise ValueError('Import transform {} returned {} documents instead of {}'.format(
+                        getattr(transform, '__name__', transform), len(transformed), len(documents)
+                    ))
+                documents = transformed
+        documents = dict(zip(shas, documents))
+        for sha, data, error in parsed:
+            if data is None:
+                yield sha, data, error
+                continue
+            data = documents[sha]
+            if data is None:
+                yield sha, None, 'Skipped by import transforms'
+                continue
+            missing = [field for field in REQUIRED_FIELDS if field not in data]
+            if missing:
+                yield sha, None, 'Missing fields after import transforms: {}'.format(', '.join(missing))
+                continue
+            yield sha, data, None
+
+    def import_type(self, data):
+        '''
+        Create DeviceType with all its components, returns (DeviceType, errors), DeviceType is None if it failed
+        '''
+        model_form = self.get_model_form(data)
+
+        with self.timer('validate'):
+            valid = model_form.is_valid()
+        if valid:
+            try:
+                with transaction.atomic(), skip_linking():
+                    with self.timer('write'):
+                        obj = model_form.save()
+
+                    for field_name, related_object_form in self.related_object_forms.items():
+                        related_objs = []
+                        seen = {}
+                        unique_keys = self.get_unique_keys(related_object_form._meta.model)
+                        # tree fields of MPTT models are set by save(), and items may refer to their parents
+                        bulk = not issubclass(related_object_form._meta.model, MPTTModel)
+                        for i, rel_obj_data in enumerate(data.get(field_name, list())):
+                            f = self.get_component_form(related_object_form, obj, rel_obj_data)
+                            with self.timer('validate'):
+                                valid = f.is_valid()
+                            if valid:
+                                with self.timer('write'):
+                                    related_obj = f.save(commit=not bulk)
+                                if bulk:
+                                    self.check_unique(model_form, field_name, i, related_obj, unique_keys, seen)
+                                related_objs.append(related_obj)
+                            else:
+                                self.add_component_errors(model_form, field_name, i, f)
+                        if model_form.errors:
+                            raise AbortTransaction()
+                        # components of the next kinds may refer to these ones, so they are saved kind by kind
+                        if bulk and related_objs:
+                            with self.timer('write'):
+                                related_object_form._meta.model.objects.bulk_create(
+                                    related_objs, batch_size=self.batch_size
+                                )
+                                log_created(related_objs, batch_size=self.batch_size)
+            except AbortTransaction:
+                # errors are in model_form
+                pass
+            except PermissionsViolation:
+                return None, ['Permission denied']
+            except IntegrityError as e:
+                return None, [f'Database error: {e}']
+        if model_form.errors:
+            return None, self.get_errors(model_form)
+        return obj, []
+
+    def update_types(self, pk_list):
+        '''
+        Apply changed files to device types which are already imported
+        result = {
+            'updated': [devicetype_pk], 'errored': 0, 'update': True,
+            'changes': {'created': 0, 'updated': 0, 'deleted': 0}
+        }
+        '''
+        if not self.user.has_perms(self.get_update_permissions()):
+            raise PermissionsViolation()
+        changes = {'created': 0, 'updated': 0, 'deleted': 0}
+        updated = []
+        errored = 0
+        result = {'updated': updated, 'errored': errored, 'update': True, 'changes': changes}
+        metadevicetypes, query_data, dt_files = self.fetch_files(
+            MetaDeviceType.objects.filter(pk__in=pk_list, is_imported=True, is_new=True)
+        )
+        if not query_data:
+            return result
+        for sha in query_data:
+            if sha not in dt_files:
+                errored += 1
+                self.add_result(metadevicetypes[sha], errors=['Can not fetch the file'], reason='fetch')
+        device_types = DeviceType.objects.in_bulk([item['imported_dt'] for item in metadevicetypes.values()])
+        resolver = self.get_resolver()
+
+        applied = []
+        self.progress.start('parse', total=len(dt_files))
+        self.progress.start('save', total=len(dt_files))
+        # applied files of device types which are saved already must not be lost if the job fails
+        try:
+            for sha, data, error in self.parse_documents(dt_files):
+                self.progress.advance('parse')
+                started = time.monotonic()
+                device_type = device_types.get(metadevicetypes[sha]['imported_dt'])
+                reason = 'validation'
+                if data is None:
+                    errors = [error]
+                    reason = 'parse'
+                elif device_type is None:
+                    errors = ['Imported device type does not exist']
+                    reason = 'missing_device_type'
+                else:
+                    resolver.create_missing([data['manufacturer']])
+                    resolver.resolve(data)
+                    type_changes, errors = self.update_type(device_type, data)
+                if errors:
+                    errored += 1
+                    device_type = None
+                else:
+                    updated.append(device_type.pk)
+                    applied.append(metadevicetypes[sha]['pk'])
+                    for key, count in type_changes.items():
+                        changes[key] += count
+                self.add_result(
+                    metadevicetypes[sha],
+                    imported_dt=device_type.pk if device_type is not None else None,
+                    duration=time.monotonic() - started,
+                    errors=errors,
+                    reason=reason,
+                )
+                self.progress.advance('save')
+        finally:
+            for i in range(0, len(applied), self.batch_size):
+                MetaDeviceType.objects.filter(pk__in=applied[i:i + self.batch_size]).update(
+                    imported_sha=F('sha'), is_new=False
+                )
+            self.save_results()
+        self.progress.finish('parse')
+        self.progress.finish('save')
+        result.update({'errored': errored})
+        self.report(
+            device_types=len(updated),
+            manufacturers=resolver.created,
+            errored=errored,
+            **{f'components_{action}': count for action, count in changes.items()}
+        )
+        return result
+
+    def update_type(self, device_type, data):
+        '''
+        Apply data to an existing DeviceType, returns (changes, errors)
+        Only changed fields and components are written: components are matched by name,
+        missing ones are created, changed ones are updated and the ones which are gone are deleted.
+        Changes are found by comparing field values before and after validation, has_changed() of
+        the forms compares the data with initial values of another kind (names with pks).
+        '''
+        changes = {'created': 0, 'updated': 0, 'deleted': 0}
+        values = self.get_values(device_type)
+        model_form = self.get_model_form(data, instance=device_type)
+
+        with self.timer('validate'):
+            valid = model_form.is_valid()
+        if valid:
+            try:
+                with transaction.atomic():
+                    if self.get_values(model_form.instance) != values:
+                        with self.timer('write'):
+                            model_form.save()
+                        changes['updated'] += 1
+
+                    for field_name, related_object_form in self.related_object_forms.items():
+                        model = related_object_form._meta.model
+                        existing = {obj.name: obj for obj in model.objects.filter(device_type=device_type)}
+                        related_objs = []
+                        changed_forms = []
+                        seen = {}
+                        unique_keys = self.get_unique_keys(model)
+                        bulk = not issubclass(model, MPTTModel)
+                        for i, rel_obj_data in enumerate(data.get(field_name, list())):
+                            instance = existing.pop(str(rel_obj_data.get('name')), None)
+                            instance_values = self.get_values(instance) if instance is not None else None
+                            f = self.get_component_form(related_object_form, device_type, rel_obj_data, instance)
+                            with self.timer('validate'):
+                                valid = f.is_valid()
+                            if not valid:
+                                self.add_component_errors(model_form, field_name, i, f)
+                                continue
+                            if instance is None:
+                                with self.timer('write'):
+                                    related_obj = f.save(commit=not bulk)
+                                if bulk:
+                                    related_objs.append(related_obj)
+                                changes['created'] += 1
+                            else:
+                                related_obj = instance
+                                if self.get_values(instance) != instance_values:
+                                    changed_forms.append(f)
+                            self.check_unique(model_form, field_name, i, related_obj, unique_keys, seen)
+                        if model_form.errors:
+                            raise AbortTransaction()
+                        with self.timer('write'):
+                            # removed components go first, changed ones may take their unique values
+                            if existing:
+                                model.objects.filter(pk__in=[obj.pk for obj in existing.values()]).delete()
+                                changes['deleted'] += len(existing)
+                            for f in changed_forms:
+                                f.save()
+                            changes['updated'] += len(changed_forms)
+                            if related_objs:
+                                model.objects.bulk_create(related_objs, batch_size=self.batch_size)
+                                log_created(related_objs, batch_size=self.batch_size)
+            except AbortTransaction:
+                pass
+            except PermissionsViolation:
+                return changes, ['Permission denied']
+            except IntegrityError as e:
+                return changes, [f'Database error: {e}']
+        if model_form.errors:
+            return changes, self.get_errors(model_form)
+        return changes, []
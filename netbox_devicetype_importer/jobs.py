@@ -0,0 +1,256 @@
+import logging
+import uuid
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django_rq import get_queue
+from redis.exceptions import RedisError
+
+from extras.choices import JobResultStatusChoices, LogLevelChoices
+from extras.context_managers import change_logging
+from extras.models import JobResult
+from utilities.exceptions import PermissionsViolation
+from utilities.utils import NetBoxFakeRequest
+
+from .cache import BlobCache
+from .importer import MetaDeviceTypeImporter
+from .models import MetaDeviceType, MetaDeviceTypeTree
+from .progress import JobProgress
+from .sync import MetaDeviceTypeSync
+from .utilities import (
+    ArchiveRepoAPI, BulkRepoAPI, GitHubAPI, GitHubGQLAPI, GQLError, LocalRepoAPI, RepoError,
+)
+
+
+logger = logging.getLogger('netbox.plugins.netbox_devicetype_importer')
+
+
+def get_plugin_settings(**options):
+    '''
+    Plugin settings, options override them
+    '''
+    plugin_settings = dict(settings.PLUGINS_CONFIG.get('netbox_devicetype_importer', {}))
+    plugin_settings.update({key: value for key, value in options.items() if value is not None})
+    return plugin_settings
+
+
+def get_repo_api(archive=False, **options):
+    '''
+    Backend of the device type library.
+    With archive the whole library is read from the repository archive, when it is allowed by the settings.
+    Otherwise the API reads files from the archive only when archive_threshold or more of them are fetched.
+    '''
+    plugin_settings = get_plugin_settings(**options)
+    repo_path = plugin_settings.get('repo_path')
+    if repo_path:
+        return LocalRepoAPI(path=repo_path, ref=plugin_settings.get('repo_ref'))
+    if plugin_settings.get('repo_archive'):
+        return ArchiveRepoAPI(source=plugin_settings.get('repo_archive'))
+    token = plugin_settings.get('github_token')
+    use_gql = plugin_settings.get('use_gql')
+    repo = plugin_settings.get('repo')
+    owner = plugin_settings.get('repo_owner')
+    ref = plugin_settings.get('repo_branch')
+    threshold = plugin_settings.get('archive_threshold')
+    archive_api = None
+    if threshold:
+        archive_api = ArchiveRepoAPI(
+            token=token, owner=owner, repo=repo, ref=ref, retries=plugin_settings.get('retries')
+        )
+        if archive:
+            return archive_api
+    gql_options = {
+        'chunk_size': plugin_settings.get('files_chunk_size'),
+        'max_workers': plugin_settings.get('max_workers'),
+        'retries': plugin_settings.get('retries'),
+        'ref': ref,
+    }
+    if token and use_gql:
+        gh_api = GitHubGQLAPI(token=token, owner=owner, repo=repo, **gql_options)
+    else:
+        gh_api = GitHubAPI(
+            token=token,
+            owner=owner,
+            repo=repo,
+            max_workers=plugin_settings.get('max_workers'),
+            cache_dir=plugin_settings.get('rest_cache_dir'),
+            retries=plugin_settings.get('retries'),
+            ref=ref,
+        )
+    if archive_api is not None:
+        return BulkRepoAPI(gh_api, archive_api, threshold)
+    return gh_api
+
+
+def get_blob_cache(**options):
+    plugin_settings = get_plugin_settings(**options)
+    if not plugin_settings.get('blob_cache'):
+        return None
+    return BlobCache(compress=plugin_settings.get('blob_cache_compress'))
+
+
+def get_importer(gh_api, user, progress, job_id=None, **options):
+    plugin_settings = get_plugin_settings(**options)
+    return MetaDeviceTypeImporter(
+        gh_api,
+        user,
+        progress=progress,
+        blob_cache=get_blob_cache(**options),
+        parse_workers=plugin_settings.get('parse_workers'),
+        job_id=job_id,
+        manufacturer_aliases=plugin_settings.get('manufacturer_aliases'),
+        transforms=plugin_settings.get('import_transforms'),
+    )
+
+
+def get_fake_request(user):
+    '''
+    Request for change logging of imports started outside of a web request, as runscript of NetBox does
+    '''
+    return NetBoxFakeRequest({
+        'META': {},
+        'POST': {},
+        'GET': {},
+        'FILES': {},
+        'user': user,
+        'path': '',
+        'id': uuid.uuid4(),
+    })
+
+
+def enqueue_job(func, name, user, request=None, **kwargs):
+    '''
+    Run func in RQ worker, or in-process if background jobs are disabled or Redis is not reachable.
+    request is copy_safe_request() of the web request, objects changed by the job are change logged for it.
+    '''
+    plugin_settings = get_plugin_settings()
+    job_result = JobResult.objects.create(
+        name=name,
+        obj_type=ContentType.objects.get_for_model(MetaDeviceType),
+        user=user,
+        job_id=uuid.uuid4(),
+    )
+    if plugin_settings.get('background_jobs'):
+        try:
+            # RQ_DEFAULT_TIMEOUT of NetBox is too short for an import of the whole library
+            get_queue('default').enqueue(
+                func,
+                job_id=str(job_result.job_id),
+                job_timeout=plugin_settings.get('job_timeout'),
+                job_result=job_result,
+                request=request,
+                **kwargs
+            )
+            return job_result
+        except RedisError as e:
+            logger.warning(f'Can not enqueue {name} job, running it in-process: {e}')
+    func(job_result=job_result, request=request, **kwargs)
+    return job_result
+
+
+def run_job(job_result, progress, func, request=None):
+    job_result.set_status(JobResultStatusChoices.STATUS_RUNNING)
+    job_result.save()
+    try:
+        # there is no current request in the worker, changes are logged for the request which started the job
+        with change_logging(request) if request is not None else nullcontext():
+            func()
+    except GQLError as e:
+        progress.message(LogLevelChoices.LOG_FAILURE, f'GraphQL API Error: {e.message}')
+        job_result.set_status(JobResultStatusChoices.STATUS_FAILED)
+    except RepoError as e:
+        progress.message(LogLevelChoices.LOG_FAILURE, f'Repository Error: {e.message}')
+        job_result.set_status(JobResultStatusChoices.STATUS_FAILED)
+    except PermissionsViolation:
+        progress.message(LogLevelChoices.LOG_FAILURE, 'Permission denied')
+        job_result.set_status(JobResultStatusChoices.STATUS_FAILED)
+    except Exception as e:
+        logger.exception(f'{job_result.name} job failed')
+        progress.message(LogLevelChoices.LOG_FAILURE, f'An exception occurred: {e}')
+        job_result.set_status(JobResultStatusChoices.STATUS_ERRORED)
+    else:
+        job_result.set_status(JobResultStatusChoices.STATUS_COMPLETED)
+    progress.save()
+
+
+def load_job(job_result, request=None, **kwargs):
+    blob_cache = get_blob_cache()
+    plugin_settings = get_plugin_settings()
+    prefetch = blob_cache is not None and plugin_settings.get('prefetch_blobs')
+    phases = ('tree', 'save', 'files') if prefetch else ('tree', 'save')
+    progress = JobProgress(job_result, phases=phases, operation='load')
+
+    def load():
+        full = kwargs.get('full', False)
+        # a first or full load reads the whole library, one archive download is cheaper than the API
+        gh_api = get_repo_api(archive=full or not MetaDeviceTypeTree.objects.exists())
+        sync = MetaDeviceTypeSync(progress=progress)
+        stats = sync.sync_repo(gh_api, full=full)
+        if blob_cache is not None and isinstance(gh_api, ArchiveRepoAPI):
+            # files are in memory already, keep them for Import
+            progress.start('files', total=len(sync.changed))
+            blob_cache.get_files(gh_api, sync.changed)
+            progress.finish('files')
+        elif prefetch:
+            progress.start('files', total=len(sync.changed))
+            blob_cache.get_files(gh_api, sync.changed)
+            progress.finish('files')
+        progress.set_result(cost=gh_api.cost, commit=sync.commit, **stats)
+        if sync.tree_unchanged:
+            progress.message(LogLevelChoices.LOG_INFO, 'Device type library is unchanged')
+            return
+        progress.message(
+            LogLevelChoices.LOG_SUCCESS,
+            'Loaded: {loaded}, Created: {created}, Updated: {updated}, '
+            'Unchanged: {unchanged}, Removed: {removed}'.format(**stats)
+        )
+
+    run_job(job_result, progress, load, request)
+
+
+def import_job(job_result, pk_list, dry_run=False, update=False, request=None, **kwargs):
+    operation = 'update' if update else 'dry_run' if dry_run else 'import'
+    progress = JobProgress(job_result, phases=('files', 'parse', 'save'), operation=operation)
+
+    def import_types():
+        gh_api = get_repo_api()
+        importer = get_importer(gh_api, job_result.user, progress, job_id=job_result.job_id)
+        if dry_run:
+            diff = importer.diff_types(pk_list)
+            progress.set_result(cost=gh_api.cost, dry_run=True, diff=diff)
+            progress.message(LogLevelChoices.LOG_INFO, get_diff_message(diff))
+            return
+        if update:
+            result = importer.update_types(pk_list)
+            progress.set_result(cost=gh_api.cost, **result)
+            if result['updated']:
+                progress.message(
+                    LogLevelChoices.LOG_SUCCESS,
+                    'Updated: {}, Components created: {created}, updated: {updated}, deleted: {deleted}'.format(
+                        len(result['updated']), **result['changes']
+                    )
+                )
+            if result['errored']:
+                progress.message(LogLevelChoices.LOG_FAILURE, f'Failed: {result["errored"]}')
+            elif not result['updated']:
+                progress.message(LogLevelChoices.LOG_WARNING, 'Nothing to update')
+            return
+        result = importer.import_types(pk_list)
+        progress.set_result(cost=gh_api.cost, **result)
+        if result['imported']:
+            progress.message(LogLevelChoices.LOG_SUCCESS, f'Imported: {len(result["imported"])}')
+            if result['errored']:
+                progress.message(LogLevelChoices.LOG_FAILURE, f'Failed: {result["errored"]}')
+        elif result['errored']:
+            progress.message(LogLevelChoices.LOG_FAILURE, 'Can not import Device Types')
+        else:
+            progress.message(LogLevelChoices.LOG_WARNING, 'Nothing to import')
+
+    run_job(job_result, progress, import_types, request)
+
+
+def get_diff_message(diff):
+    return 'Dry run. Would create: {}, Already exist: {}, Invalid: {}, New manufacturers: {}'.format(
+        len(diff['create']), len(diff['exists']), len(diff['invalid']), len(diff['manufacturers'])
+    )
@@ -0,0 +1,146 @@
+import json
+from fnmatch import fnmatch
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from extras.context_managers import change_logging
+
+from netbox_devicetype_importer.jobs import get_diff_message, get_fake_request, get_importer, get_repo_api
+from netbox_devicetype_importer.importer import MetaDeviceTypeImporter
+from netbox_devicetype_importer.models import MetaDeviceType
+from netbox_devicetype_importer.progress import ConsoleProgress
+from netbox_devicetype_importer.utilities import RepoError
+
+
+class Command(BaseCommand):
+    help = 'Import loaded device types, the same as the Import button'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repo-path', help='Local checkout or bare clone of the library, overrides repo_path')
+        parser.add_argument('--archive', help='Local path or URL of a repository archive, overrides repo_archive')
+        parser.add_argument('--vendor', action='append', help='Import only vendors matching the glob, can be repeated')
+        parser.add_argument('--name', action='append', help='Import only files matching the glob, can be repeated')
+        parser.add_argument('--all', action='store_true', help='Import all device types which are not imported yet')
+        parser.add_argument('--update', action='store_true', help='Apply changed files to imported device types')
+        parser.add_argument('--dry-run', action='store_true', help='Validate device types, nothing is imported')
+        parser.add_argument('--jobs', type=int, help='Number of parse workers and concurrent requests')
+        parser.add_argument('--json', action='store_true', help='Write progress and result as JSON lines')
+        parser.add_argument('--user', help='User the device types are imported as, the first superuser by default')
+
+    def handle(self, *args, **options):
+        if not (options['vendor'] or options['name'] or options['all']):
+            raise CommandError('Use --vendor, --name or --all to select device types')
+
+        if options['update'] and options['dry_run']:
+            raise CommandError('--dry-run is not supported with --update')
+        selected = []
+        if options['update']:
+            queryset = MetaDeviceType.objects.filter(is_imported=True, is_new=True)
+        else:
+            queryset = MetaDeviceType.objects.filter(is_imported=False)
+        queryset = queryset.order_by('vendor', 'name')
+        for pk, vendor, name in queryset.values_list('pk', 'vendor', 'name'):
+            if options['vendor'] and not self.match(vendor, options['vendor']):
+                continue
+            if options['name'] and not self.match(name, options['name']):
+                continue
+            selected.append((pk, vendor, name))
+
+        if not selected:
+            self.stdout.write('Nothing to update' if options['update'] else 'Nothing to import')
+            return
+
+        user = self.get_user(options['user'])
+        if options['update'] and not user.has_perms(MetaDeviceTypeImporter.get_update_permissions()):
+            raise CommandError(f'{user} is not allowed to change device types and their components')
+        operation = 'update' if options['update'] else 'dry_run' if options['dry_run'] else 'import'
+        progress = ConsoleProgress(
+            self.stdout, phases=('files', 'parse', 'save'), as_json=options['json'], operation=operation
+        )
+        try:
+            gh_api = get_repo_api(
+                repo_path=options['repo_path'], repo_archive=options['archive'], max_workers=options['jobs']
+            )
+            importer = get_importer(gh_api, user, progress, parse_workers=options['jobs'])
+            pk_list = [pk for pk, vendor, name in selected]
+            if options['dry_run']:
+                self.write_diff(importer.diff_types(pk_list), progress, options['json'])
+                return
+            # created and changed objects are change logged for the user, the same as in the web UI
+            with change_logging(get_fake_request(user)):
+                if options['update']:
+                    self.write_update(importer.update_types(pk_list), progress, options['json'], gh_api.cost)
+                    return
+                result = importer.import_types(pk_list)
+        except RepoError as e:
+            raise CommandError(e.message)
+
+        elapsed = progress.elapsed()
+        imported = len(result['imported'])
+        summary = {
+            'selected': len(selected),
+            'imported': imported,
+            'errored': result['errored'],
+            'manufacturers': result['manufacturers'],
+            'cost': gh_api.cost,
+            'elapsed': elapsed,
+            'rate': round(imported / elapsed, 1) if elapsed else 0,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps({'type': 'result', **summary}))
+        else:
+            self.stdout.write(
+                'Imported: {imported}, Failed: {errored}, Manufacturers: {manufacturers} '
+                'in {elapsed:.1f}s ({rate}/s)'.format(**summary)
+            )
+
+    def write_update(self, result, progress, as_json, cost):
+        elapsed = progress.elapsed()
+        summary = {
+            'updated': len(result['updated']),
+            'errored': result['errored'],
+            'cost': cost,
+            'elapsed': elapsed,
+            'rate': round(len(result['updated']) / elapsed, 1) if elapsed else 0,
+            'changes': result['changes'],
+        }
+        if as_json:
+            self.stdout.write(json.dumps({'type': 'result', **summary}))
+            return
+        self.stdout.write(
+            'Updated: {updated}, Failed: {errored} in {elapsed:.1f}s ({rate}/s)'.format(**summary)
+        )
+        self.stdout.write('Components created: {created}, updated: {updated}, deleted: {deleted}'.format(
+            **result['changes']
+        ))
+
+    def write_diff(self, diff, progress, as_json):
+        if as_json:
+            self.stdout.write(json.dumps({'type': 'result', 'dry_run': True, 'elapsed': progress.elapsed(), **diff}))
+            return
+        for action in ('create', 'exists', 'invalid'):
+            for item in diff[action]:
+                line = f'{action}: {item["vendor"]}/{item["name"]}'
+                if item.get('errors'):
+                    line += ': ' + '; '.join(item['errors'])
+                self.stdout.write(line)
+        if diff['manufacturers']:
+            self.stdout.write('new manufacturers: ' + ', '.join(diff['manufacturers']))
+        self.stdout.write(get_diff_message(diff))
+
+    def get_user(self, username):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User {username} does not exist')
+        user = User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('There is no active superuser, use --user')
+        return user
+
+    @staticmethod
+    def match(value, patterns):
+        return any(fnmatch(value, pattern) for pattern in patterns)
@@ -0,0 +1,76 @@
+import json
+from fnmatch import fnmatch
+
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_devicetype_importer.jobs import get_repo_api
+from netbox_devicetype_importer.models import MetaDeviceTypeTree
+from netbox_devicetype_importer.progress import ConsoleProgress
+from netbox_devicetype_importer.sync import MetaDeviceTypeSync
+from netbox_devicetype_importer.utilities import RepoError
+
+
+class Command(BaseCommand):
+    help = 'Load the device type library tree, the same as the Load button'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repo-path', help='Local checkout or bare clone of the library, overrides repo_path')
+        parser.add_argument('--archive', help='Local path or URL of a repository archive, overrides repo_archive')
+        parser.add_argument('--vendor', action='append', help='Load only vendors matching the glob, can be repeated')
+        parser.add_argument('--full', action='store_true', help='Load all vendors, not only the changed ones')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would be changed without saving it')
+        parser.add_argument('--jobs', type=int, help='Number of concurrent requests')
+        parser.add_argument('--json', action='store_true', help='Write progress and result as JSON lines')
+
+    def handle(self, *args, **options):
+        progress = ConsoleProgress(
+            self.stdout, phases=('tree', 'save'), as_json=options['json'], operation='load'
+        )
+        sync = MetaDeviceTypeSync(progress=progress, dry_run=options['dry_run'])
+        try:
+            gh_api = get_repo_api(
+                repo_path=options['repo_path'], repo_archive=options['archive'], max_workers=options['jobs'],
+                archive=not options['vendor'] and (options['full'] or not MetaDeviceTypeTree.objects.exists()),
+            )
+            if options['vendor']:
+                stats = self.sync_vendors(gh_api, sync, progress, options['vendor'])
+            else:
+                stats = sync.sync_repo(gh_api, full=options['full'])
+        except RepoError as e:
+            raise CommandError(e.message)
+
+        elapsed = progress.elapsed()
+        result = dict(stats, elapsed=elapsed, rate=round(stats['loaded'] / elapsed, 1) if elapsed else 0)
+        result.update(
+            dry_run=options['dry_run'], unchanged_tree=sync.tree_unchanged, cost=gh_api.cost, commit=sync.commit
+        )
+        if options['json']:
+            self.stdout.write(json.dumps({'type': 'result', **result}))
+        elif sync.tree_unchanged:
+            self.stdout.write('Device type library is unchanged')
+        else:
+            self.stdout.write(
+                '{prefix}Loaded: {loaded}, Created: {created}, Updated: {updated}, Unchanged: {unchanged}, '
+                'Removed: {removed} in {elapsed:.1f}s ({rate}/s)'.format(
+                    prefix='Dry run. ' if options['dry_run'] else '', **result
+                )
+            )
+
+    def sync_vendors(self, gh_api, sync, progress, patterns):
+        '''
+        Sync only matching vendors, the stored tree oids are left as they are
+        '''
+        progress.start('tree', total=1)
+        sync.commit = gh_api.pin() or ''
+        root = gh_api.get_root()
+        if root is None:
+            tree = gh_api.get_tree()
+        else:
+            tree = gh_api.get_tree(vendors=[vendor for vendor in root[1] if self.match(vendor, patterns)])
+        tree = {vendor: models for vendor, models in tree.items() if self.match(vendor, patterns)}
+        progress.finish('tree')
+        return sync.sync(tree, vendors=list(tree))
+
+    @staticmethod
+    def match(value, patterns):
+        return any(fnmatch(value, pattern) for pattern in patterns)
@@ -0,0 +1,73 @@
+from django.utils.text import slugify
+
+from dcim.models import Manufacturer
+
+from .signals import log_created
+
+
+class ManufacturerResolver():
+    '''
+    Resolve vendor names of the library to manufacturers.
+    All manufacturers are read in one query and matched by name or slug, case-insensitively.
+    aliases = {'vendor': 'Manufacturer name'}
+    '''
+    batch_size = 500
+
+    def __init__(self, aliases=None):
+        self.aliases = {str(vendor).lower(): name for vendor, name in (aliases or {}).items()}
+        self.index = {}
+        self.created = 0
+        for manufacturer in Manufacturer.objects.only('pk', 'name', 'slug'):
+            self.add(manufacturer)
+
+    def add(self, manufacturer):
+        self.index.setdefault(manufacturer.name.lower(), manufacturer)
+        self.index.setdefault(manufacturer.slug.lower(), manufacturer)
+
+    def get_name(self, vendor):
+        '''
+        Name a manufacturer of the vendor is created with
+        '''
+        vendor = str(vendor)
+        return self.aliases.get(vendor.lower(), vendor)
+
+    def get(self, vendor):
+        '''
+        Manufacturer of the vendor, None if there is no such manufacturer
+        '''
+        name = self.get_name(vendor)
+        return self.index.get(name.lower()) or self.index.get(slugify(name))
+
+    def get_missing(self, vendors):
+        '''
+        returns {'slug': 'name'} of manufacturers which do not exist
+        '''
+        missing = {}
+        for vendor in vendors:
+            if self.get(vendor) is None:
+                name = self.get_name(vendor)
+                missing.setdefault(slugify(name), name)
+        return missing
+
+    def create_missing(self, vendors):
+        '''
+        Create manufacturers which do not exist in one query, returns the number of created manufacturers
+        '''
+        missing = self.get_missing(vendors)
+        manufacturers = [Manufacturer(name=name, slug=slug) for slug, name in missing.items()]
+        if manufacturers:
+            Manufacturer.objects.bulk_create(manufacturers, batch_size=self.batch_size)
+            log_created(manufacturers, batch_size=self.batch_size)
+            for manufacturer in manufacturers:
+                self.add(manufacturer)
+            self.created += len(manufacturers)
+        return len(manufacturers)
+
+    def resolve(self, data):
+        '''
+        Point data['manufacturer'] to the name of an existing manufacturer, the import form looks it up by name
+        '''
+        manufacturer = self.get(data['manufacturer'])
+        if manufacturer is not None:
+            data['manufacturer'] = manufacturer.name
+        return manufacturer
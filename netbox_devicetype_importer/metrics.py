@@ -0,0 +1,108 @@
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import Counter, Histogram
+except ImportError:
+    Counter = Histogram = None
+
+
+# metrics are registered in the default registry, NetBox exposes it on /metrics with METRICS_ENABLED.
+# Jobs run in rqworker, their metrics reach /metrics only in the multiprocess mode of prometheus_client,
+# with PROMETHEUS_MULTIPROC_DIR set to the same directory for NetBox and the worker.
+logger = logging.getLogger('netbox.plugins.netbox_devicetype_importer.metrics')
+
+PREFIX = 'netbox_devicetype_importer'
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+
+class NoMetric():
+    '''
+    Stand-in when prometheus_client is not installed
+    '''
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def get_metric(metric_class, name, documentation, labels, **kwargs):
+    if metric_class is None:
+        return NoMetric()
+    return metric_class(f'{PREFIX}_{name}', documentation, labels, **kwargs)
+
+
+phase_duration = get_metric(
+    Histogram, 'phase_duration_seconds', 'Duration of Load and Import phases', ('operation', 'phase'),
+    buckets=DURATION_BUCKETS,
+)
+device_type_duration = get_metric(
+    Histogram, 'device_type_duration_seconds', 'Time to save one device type', ('operation',),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+request_duration = get_metric(
+    Histogram, 'request_duration_seconds', 'Duration of requests to the repository API', ('api',),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+requests_total = get_metric(Counter, 'requests', 'Requests to the repository API', ('api', 'status'))
+fetched_bytes = get_metric(Counter, 'fetched_bytes', 'Bytes fetched from the repository API', ('api',))
+graphql_cost = get_metric(Counter, 'graphql_cost', 'GitHub GraphQL rate limit cost', ())
+rows_total = get_metric(Counter, 'rows', 'Rows written by Load and Import', ('operation', 'action'))
+failures_total = get_metric(Counter, 'failures', 'Device types which failed to import', ('operation', 'reason'))
+
+
+def log_event(event, **fields):
+    '''
+    Structured log record, fields are in the message and in the devicetype_importer attribute of the record
+    '''
+    message = ' '.join(f'{key}={value}' for key, value in fields.items())
+    logger.info(f'{event} {message}', extra={'devicetype_importer': {'event': event, **fields}})
+
+
+def observe_phase(operation, phase, duration, **fields):
+    phase_duration.labels(operation=operation, phase=phase).observe(duration)
+    log_event('phase', operation=operation, phase=phase, duration=round(duration, 3), **fields)
+
+
+def observe_request(api, status, size, duration):
+    request_duration.labels(api=api).observe(duration)
+    requests_total.labels(api=api, status=status).inc()
+    fetched_bytes.labels(api=api).inc(size)
+
+
+def add_rows(operation, **counts):
+    for action, count in counts.items():
+        if count:
+            rows_total.labels(operation=operation, action=action).inc(count)
+
+
+def add_failure(operation, reason):
+    failures_total.labels(operation=operation, reason=reason).inc()
+
+
+class PhaseTimer():
+    '''
+    Time of phases which alternate, such as form validation and DB writes of every device type.
+    Phase names differ from the JobProgress ones, both are observed in the same histogram.
+    totals = {'validate': 0.0, 'write': 0.0}
+    '''
+    def __init__(self):
+        self.totals = defaultdict(float)
+
+    @contextmanager
+    def __call__(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[phase] += time.perf_counter() - started
+
+    def observe(self, operation):
+        for phase, duration in self.totals.items():
+            observe_phase(operation, phase, duration)
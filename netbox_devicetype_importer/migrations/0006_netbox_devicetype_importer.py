@@ -0,0 +1,23 @@
+# Generated by Django 4.0.8 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_devicetype_importer', '0005_netbox_devicetype_importer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetaDeviceTypeBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('sha', models.CharField(max_length=40, unique=True)),
+                ('data', models.BinaryField()),
+                ('compressed', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.8 on 2026-10-17 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_devicetype_importer', '0006_netbox_devicetype_importer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetaDeviceTypeTree',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('path', models.CharField(max_length=200, unique=True)),
+                ('oid', models.CharField(max_length=40)),
+            ],
+        ),
+    ]
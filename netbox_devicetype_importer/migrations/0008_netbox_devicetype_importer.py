@@ -0,0 +1,42 @@
+# Generated by Django 4.0.8 on 2026-10-17 12:05
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def remove_duplicates(apps, schema_editor):
+    MetaDeviceType = apps.get_model('netbox_devicetype_importer', 'MetaDeviceType')
+    seen = set()
+    duplicates = []
+    # keep the imported one, or the latest one
+    rows = MetaDeviceType.objects.order_by(
+        'vendor', 'name', F('imported_dt').desc(nulls_last=True), '-pk'
+    ).values_list('pk', 'vendor', 'name')
+    for pk, vendor, name in rows:
+        if (vendor, name) in seen:
+            duplicates.append(pk)
+        seen.add((vendor, name))
+    MetaDeviceType.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_devicetype_importer', '0007_netbox_devicetype_importer'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='metadevicetype',
+            unique_together={('vendor', 'name')},
+        ),
+        migrations.AddIndex(
+            model_name='metadevicetype',
+            index=models.Index(fields=['sha'], name='metadevicetype_sha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metadevicetype',
+            index=models.Index(fields=['is_imported', 'is_new'], name='metadevicetype_flags_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.0.8 on 2026-10-17 12:48
+
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+
+logger = logging.getLogger('netbox.plugins.netbox_devicetype_importer')
+
+# icontains is UPPER("field"::text) LIKE UPPER('%value%') on PostgreSQL,
+# a trigram index on the same expression serves it
+TRIGRAM_INDEXES = {
+    'metadevicetype_name_trgm': 'name',
+    'metadevicetype_vendor_trgm': 'vendor',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    db_table = apps.get_model('netbox_devicetype_importer', 'MetaDeviceType')._meta.db_table
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError as e:
+        # the extension needs a privileged user, search works without the indexes
+        logger.warning(f'Can not create pg_trgm extension, trigram indexes are skipped: {e}')
+        return
+    for index_name, field in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name} ON {db_table} USING gin ((UPPER({field}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_devicetype_importer', '0008_netbox_devicetype_importer'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
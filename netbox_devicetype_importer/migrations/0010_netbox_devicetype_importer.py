@@ -0,0 +1,32 @@
+# Generated by Django 4.0.8 on 2026-10-17 14:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_devicetype_importer', '0009_netbox_devicetype_importer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetaDeviceTypeImportResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('job_id', models.UUIDField(db_index=True)),
+                ('vendor', models.CharField(max_length=50)),
+                ('name', models.CharField(max_length=100)),
+                ('success', models.BooleanField(default=False)),
+                ('imported_dt', models.IntegerField(blank=True, null=True)),
+                ('duration', models.FloatField(default=0)),
+                ('errors', models.JSONField(default=list)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('metadevicetype', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_results', to='netbox_devicetype_importer.metadevicetype')),
+            ],
+            options={
+                'ordering': ('pk',),
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.0.8 on 2026-10-17 15:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_imported_sha(apps, schema_editor):
+    # files of already imported device types are taken as applied
+    MetaDeviceType = apps.get_model('netbox_devicetype_importer', 'MetaDeviceType')
+    MetaDeviceType.objects.filter(is_imported=True).update(imported_sha=F('sha'), is_new=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_devicetype_importer', '0010_netbox_devicetype_importer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metadevicetype',
+            name='imported_sha',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.RunPython(set_imported_sha, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.8 on 2026-10-17 15:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def remove_dangling_links(apps, schema_editor):
+    # links to deleted device types would break the foreign key
+    MetaDeviceType = apps.get_model('netbox_devicetype_importer', 'MetaDeviceType')
+    DeviceType = apps.get_model('dcim', 'DeviceType')
+    existing = DeviceType.objects.values('pk')
+    MetaDeviceType.objects.filter(imported_dt__isnull=False).exclude(imported_dt__in=existing).update(
+        imported_dt=None, imported_sha='', is_imported=False, is_new=False
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dcim', '0001_initial'),
+        ('netbox_devicetype_importer', '0011_netbox_devicetype_importer'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_dangling_links, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='metadevicetype',
+            name='imported_dt',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dcim.devicetype'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.8 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_devicetype_importer', '0012_netbox_devicetype_importer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metadevicetype',
+            name='commit',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
@@ -7,20 +7,89 @@ class MetaDeviceType(models.Model):
     name = models.CharField(max_length=100)
     vendor = models.CharField(max_length=50)
     sha = models.CharField(max_length=40)
+    # commit the row was loaded from, its file is fetched from this commit
+    commit = models.CharField(max_length=40, blank=True, default='')
     download_url = models.URLField(null=True, blank=True)
     is_new = models.BooleanField(default=True)
-    imported_dt = models.IntegerField(null=True, blank=True)
+    imported_dt = models.ForeignKey(
+        to='dcim.DeviceType',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        null=True,
+        blank=True
+    )
+    # sha of the file the device type was imported or last updated from
+    imported_sha = models.CharField(max_length=40, blank=True, default='')
     is_imported = models.BooleanField(default=False)
 
     objects = RestrictedQuerySet.as_manager()
 
+    class Meta:
+        unique_together = ('vendor', 'name')
+        indexes = [
+            models.Index(fields=['sha'], name='metadevicetype_sha_idx'),
+            models.Index(fields=['is_imported', 'is_new'], name='metadevicetype_flags_idx'),
+        ]
+
     def __str__(self):
         return self.name.split('.')[0]
 
     def save(self, *args, **kwargs):
-        if self.imported_dt:
+        if self.imported_dt_id:
             self.is_imported = True
-            self.is_new = False
+            # is_new of an imported device type means its file was changed upstream
+            self.is_new = bool(self.imported_sha) and self.sha != self.imported_sha
         else:
             self.is_imported = False
         super(MetaDeviceType, self).save(*args, **kwargs)
+
+
+class MetaDeviceTypeBlob(models.Model):
+    '''
+    Content of a device type file, keyed by git blob sha
+    '''
+    sha = models.CharField(max_length=40, unique=True)
+    data = models.BinaryField()
+    compressed = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha
+
+
+class MetaDeviceTypeTree(models.Model):
+    '''
+    Last loaded oid of the device types tree and of every vendor subtree
+    '''
+    path = models.CharField(max_length=200, unique=True)
+    oid = models.CharField(max_length=40)
+
+    def __str__(self):
+        return self.path
+
+
+class MetaDeviceTypeImportResult(models.Model):
+    '''
+    Result of importing one device type, job_id is the job_id of the import JobResult
+    '''
+    job_id = models.UUIDField(db_index=True)
+    metadevicetype = models.ForeignKey(
+        to=MetaDeviceType,
+        on_delete=models.SET_NULL,
+        related_name='import_results',
+        null=True,
+        blank=True
+    )
+    vendor = models.CharField(max_length=50)
+    name = models.CharField(max_length=100)
+    success = models.BooleanField(default=False)
+    imported_dt = models.IntegerField(null=True, blank=True)
+    duration = models.FloatField(default=0)
+    errors = models.JSONField(default=list)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('pk',)
+
+    def __str__(self):
+        return f'{self.vendor}/{self.name}'
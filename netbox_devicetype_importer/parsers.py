@@ -0,0 +1,28 @@
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+# it runs in worker processes, so it must not need Django
+REQUIRED_FIELDS = ('manufacturer', 'model')
+
+
+def parse_device_type(item):
+    '''
+    item = ('sha', 'yaml_text')
+    returns ('sha', data, 'error'), data is None if the file is not valid
+    '''
+    sha, yaml_text = item
+    try:
+        data = yaml.load(yaml_text, Loader=SafeLoader)
+    except yaml.YAMLError as e:
+        return sha, None, f'Invalid YAML: {e}'
+    if not isinstance(data, dict):
+        return sha, None, 'Device type definition must be a dictionary'
+    missing = [field for field in REQUIRED_FIELDS if field not in data]
+    if missing:
+        return sha, None, 'Missing fields: {}'.format(', '.join(missing))
+    return sha, data, None
@@ -0,0 +1,121 @@
+import json
+import time
+
+from . import metrics
+
+
+class JobProgress():
+    '''
+    Per-phase progress kept in JobResult.data
+    {
+        'phases': {'tree': {'status': 'pending', 'done': 0, 'total': 0}},
+        'messages': [{'level': 'info', 'message': ''}],
+        'result': {}
+    }
+    Works without a job result as well, then nothing is saved.
+    Durations of phases are reported to metrics with operation as a label.
+    '''
+    save_interval = 1
+
+    def __init__(self, job_result=None, phases=(), operation='job'):
+        self.job_result = job_result
+        self.operation = operation
+        self.phase_started = {}
+        self.data = {
+            'phases': {phase: {'status': 'pending', 'done': 0, 'total': 0} for phase in phases},
+            'messages': [],
+            'result': {},
+        }
+        self.last_save = 0
+        self.save()
+
+    def save(self, force=True):
+        now = time.monotonic()
+        if not force and now - self.last_save < self.save_interval:
+            return
+        self.last_save = now
+        self.write()
+
+    def write(self):
+        if self.job_result is None:
+            return
+        self.job_result.data = self.data
+        self.job_result.save()
+
+    def get_phase(self, phase):
+        return self.data['phases'].setdefault(phase, {'status': 'pending', 'done': 0, 'total': 0})
+
+    def start(self, phase, total=0):
+        self.get_phase(phase).update({'status': 'running', 'total': total})
+        self.phase_started[phase] = time.monotonic()
+        self.save()
+
+    def advance(self, phase, count=1):
+        self.get_phase(phase)['done'] += count
+        self.save(force=False)
+
+    def finish(self, phase):
+        state = self.get_phase(phase)
+        state['status'] = 'completed'
+        state['done'] = max(state['done'], state['total'])
+        started = self.phase_started.pop(phase, None)
+        if started is not None:
+            metrics.observe_phase(self.operation, phase, time.monotonic() - started, items=state['done'])
+        self.save()
+
+    def message(self, level, message):
+        self.data['messages'].append({'level': level, 'message': message})
+        self.save()
+
+    def set_result(self, **kwargs):
+        self.data['result'].update(kwargs)
+        self.save()
+
+    def item(self, **kwargs):
+        '''
+        Result of one device type, import results are kept in MetaDeviceTypeImportResult
+        '''
+        pass
+
+
+class ConsoleProgress(JobProgress):
+    '''
+    Progress written to the output of a management command, as JSON lines with as_json
+    '''
+    def __init__(self, stdout, phases=(), as_json=False, operation='job'):
+        self.stdout = stdout
+        self.as_json = as_json
+        self.started = time.monotonic()
+        super().__init__(phases=phases, operation=operation)
+
+    def elapsed(self):
+        return round(time.monotonic() - self.started, 3)
+
+    def write(self):
+        if self.as_json:
+            line = {'type': 'progress', 'elapsed': self.elapsed(), 'phases': self.data['phases']}
+            self.stdout.write(json.dumps(line))
+            return
+        phases = ', '.join(
+            f'{phase} {state["done"]}/{state["total"]}' for phase, state in self.data['phases'].items()
+            if state['status'] != 'pending'
+        )
+        if phases:
+            self.stdout.write(f'[{self.elapsed():.1f}s] {phases}')
+
+    def message(self, level, message):
+        self.data['messages'].append({'level': level, 'message': message})
+        if self.as_json:
+            self.stdout.write(json.dumps({'type': 'message', 'level': level, 'message': message}))
+        else:
+            self.stdout.write(f'{level}: {message}')
+
+    def item(self, **kwargs):
+        if self.as_json:
+            self.stdout.write(json.dumps({'type': 'item', **kwargs}))
+        elif not kwargs['success']:
+            errors = '; '.join(kwargs['errors'])
+            self.stdout.write(f'failed: {kwargs["vendor"]}/{kwargs["name"]}: {errors}')
+
+    def set_result(self, **kwargs):
+        self.data['result'].update(kwargs)
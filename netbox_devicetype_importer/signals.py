@@ -0,0 +1,72 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F, Q
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from dcim.models import DeviceType
+from extras.choices import ObjectChangeActionChoices
+from extras.models import ObjectChange
+from netbox.context import current_request
+
+from .models import MetaDeviceType
+
+
+state = threading.local()
+
+
+@contextmanager
+def skip_linking():
+    '''
+    Device types saved in the block are not linked by link_device_type, the importer links them itself
+    '''
+    previous = getattr(state, 'skip_linking', False)
+    state.skip_linking = True
+    try:
+        yield
+    finally:
+        state.skip_linking = previous
+
+
+def log_created(objects, batch_size=500):
+    '''
+    Change log of objects created with bulk_create, which sends no post_save.
+    The records are the ones handle_changed_object of NetBox writes for a saved object.
+    '''
+    request = current_request.get(None)
+    if request is None or not objects:
+        return
+    changes = []
+    for obj in objects:
+        objectchange = obj.to_objectchange(ObjectChangeActionChoices.ACTION_CREATE)
+        objectchange.user = request.user
+        objectchange.request_id = request.id
+        changes.append(objectchange)
+    ObjectChange.objects.bulk_create(changes, batch_size=batch_size)
+
+
+@receiver(pre_delete, sender=DeviceType)
+def unlink_device_type(instance, **kwargs):
+    '''
+    The device type can be imported again, SET_NULL alone would leave is_imported set
+    '''
+    MetaDeviceType.objects.filter(imported_dt=instance).update(
+        imported_dt=None, imported_sha='', is_imported=False, is_new=False
+    )
+
+
+@receiver(post_save, sender=DeviceType)
+def link_device_type(instance, created, **kwargs):
+    '''
+    Link a device type created elsewhere in NetBox to its file, files are named after the model
+    '''
+    if not created or getattr(state, 'skip_linking', False):
+        return
+    manufacturer = instance.manufacturer
+    names = {f'{value}.{ext}' for value in (instance.model, instance.slug) for ext in ('yaml', 'yml')}
+    MetaDeviceType.objects.filter(
+        Q(vendor__iexact=manufacturer.name) | Q(vendor__iexact=manufacturer.slug),
+        name__in=names,
+        imported_dt__isnull=True,
+    ).update(imported_dt=instance, imported_sha=F('sha'), is_imported=True, is_new=False)
@@ -0,0 +1,185 @@
+from django.db import transaction
+
+from . import metrics
+from .models import MetaDeviceType, MetaDeviceTypeTree
+from .progress import JobProgress
+
+
+class MetaDeviceTypeSync():
+    '''
+    Diff the repo tree against MetaDeviceType rows and apply the difference in bulk.
+    The existing rows are read in one query, and only created, changed and removed
+    rows are written, batch_size rows per query.
+    Files of created and changed rows are kept in self.changed = {'sha': 'vendor/model'}
+    sync_repo loads only vendors whose subtree oid changed since the last load.
+    The tree is read from the commit the branch points to when the load starts, the commit is saved
+    with created and changed rows, so their files are fetched from it later.
+    With dry_run nothing is written, stats tell what would be done.
+    tree = {'cisco': {
+        '2950.yaml': {'sha': ''}
+        }
+    }
+    '''
+    batch_size = 500
+    root_path = 'device-types'
+
+    def __init__(self, batch_size=None, progress=None, dry_run=False):
+        self.progress = progress or JobProgress()
+        self.dry_run = dry_run
+        if batch_size:
+            self.batch_size = batch_size
+        self.stats = {
+            'loaded': 0,
+            'created': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'removed': 0,
+        }
+        self.changed = {}
+        self.tree_unchanged = False
+        self.commit = ''
+
+    def get_existing(self, vendors=None):
+        existing = {}
+        queryset = MetaDeviceType.objects.all()
+        if vendors is not None:
+            queryset = queryset.filter(vendor__in=vendors)
+        fields = ('pk', 'vendor', 'name', 'sha', 'commit', 'is_new', 'is_imported', 'imported_dt', 'imported_sha')
+        for pk, vendor, name, sha, commit, is_new, is_imported, imported_dt, imported_sha in queryset.values_list(
+            *fields
+        ):
+            existing[(vendor, name)] = {
+                'pk': pk,
+                'sha': sha,
+                'commit': commit,
+                'is_new': is_new,
+                'is_imported': is_imported,
+                'imported_dt': imported_dt,
+                'imported_sha': imported_sha,
+            }
+        return existing
+
+    def diff(self, tree, existing):
+        to_create = []
+        to_update = []
+        for vendor, models in tree.items():
+            for model, model_data in models.items():
+                self.stats['loaded'] += 1
+                current = existing.pop((vendor, model), None)
+                if current is None:
+                    self.changed[model_data['sha']] = f'{vendor}/{model}'
+                    to_create.append(
+                        MetaDeviceType(vendor=vendor, name=model, sha=model_data['sha'], commit=self.commit)
+                    )
+                    continue
+                # same rules as MetaDeviceType.save()
+                is_imported = bool(current['imported_dt'])
+                changed = current['sha'] != model_data['sha']
+                if changed:
+                    self.changed[model_data['sha']] = f'{vendor}/{model}'
+                if is_imported:
+                    # imported device type has an update until the changed file is applied
+                    is_new = bool(current['imported_sha']) and model_data['sha'] != current['imported_sha']
+                else:
+                    is_new = changed
+                # rows loaded before commits were saved get one
+                no_commit = bool(self.commit) and not current['commit']
+                if changed or no_commit or is_new != current['is_new'] or is_imported != current['is_imported']:
+                    to_update.append(
+                        MetaDeviceType(
+                            pk=current['pk'],
+                            sha=model_data['sha'],
+                            commit=self.commit or current['commit'],
+                            is_new=is_new,
+                            is_imported=is_imported,
+                        )
+                    )
+                else:
+                    self.stats['unchanged'] += 1
+        # what is left is gone from the repo
+        to_remove = [current['pk'] for current in existing.values()]
+        return to_create, to_update, to_remove
+
+    def sync(self, tree, vendors=None):
+        '''
+        With vendors the diff is limited to rows of these vendors, other rows are left as they are
+        '''
+        self.progress.start('save', total=sum(len(models) for models in tree.values()))
+        existing = self.get_existing(vendors)
+        to_create, to_update, to_remove = self.diff(tree, existing)
+        if self.dry_run:
+            self.count(to_create, to_update, to_remove)
+            self.progress.finish('save')
+            return self.stats
+        with transaction.atomic():
+            if to_create:
+                # ON CONFLICT DO NOTHING, rows created by a concurrent load are left to it
+                MetaDeviceType.objects.bulk_create(to_create, batch_size=self.batch_size, ignore_conflicts=True)
+            if to_update:
+                MetaDeviceType.objects.bulk_update(
+                    to_update, ['sha', 'commit', 'is_new', 'is_imported'], batch_size=self.batch_size
+                )
+            for i in range(0, len(to_remove), self.batch_size):
+                MetaDeviceType.objects.filter(pk__in=to_remove[i:i + self.batch_size]).delete()
+        self.count(to_create, to_update, to_remove)
+        metrics.add_rows('load', created=len(to_create), updated=len(to_update), removed=len(to_remove))
+        self.progress.finish('save')
+        return self.stats
+
+    def count(self, to_create, to_update, to_remove):
+        self.stats['created'] = len(to_create)
+        self.stats['updated'] = len(to_update)
+        self.stats['removed'] = len(to_remove)
+
+    def sync_repo(self, gh_api, full=False):
+        '''
+        Load the tree from gh_api and sync it.
+        Nothing is loaded if the root oid is unchanged, otherwise only vendors with a changed oid are loaded.
+        '''
+        self.progress.start('tree', total=1)
+        self.commit = gh_api.pin() or ''
+        root = gh_api.get_root()
+        if root is None:
+            # backend can not tell oids
+            tree = gh_api.get_tree()
+            self.progress.finish('tree')
+            with transaction.atomic():
+                self.sync(tree)
+                if not self.dry_run:
+                    MetaDeviceTypeTree.objects.all().delete()
+            return self.stats
+        root_oid, vendor_oids = root
+        known = dict(MetaDeviceTypeTree.objects.values_list('path', 'oid'))
+        if not full and known.get(self.root_path) == root_oid:
+            self.tree_unchanged = True
+            self.progress.finish('tree')
+            return self.stats
+        vendors = None
+        if not full:
+            vendors = [
+                vendor for vendor, oid in vendor_oids.items() if known.get(f'{self.root_path}/{vendor}') != oid
+            ]
+            if len(vendors) == len(vendor_oids):
+                vendors = None
+        if vendors is None:
+            tree = gh_api.get_tree()
+        else:
+            tree = gh_api.get_tree(vendors=vendors)
+            prefix = f'{self.root_path}/'
+            vendors += [
+                path[len(prefix):] for path in known
+                if path.startswith(prefix) and path[len(prefix):] not in vendor_oids
+            ]
+        self.progress.finish('tree')
+        with transaction.atomic():
+            self.sync(tree, vendors)
+            if not self.dry_run:
+                self.save_tree(root_oid, vendor_oids)
+        return self.stats
+
+    def save_tree(self, root_oid, vendor_oids):
+        trees = [MetaDeviceTypeTree(path=self.root_path, oid=root_oid)]
+        for vendor, oid in vendor_oids.items():
+            trees.append(MetaDeviceTypeTree(path=f'{self.root_path}/{vendor}', oid=oid))
+        MetaDeviceTypeTree.objects.all().delete()
+        MetaDeviceTypeTree.objects.bulk_create(trees, batch_size=self.batch_size)
@@ -1,3 +1,5 @@
+import django_tables2 as tables
+
 # for 3.2 support
 try:
     from utilities.tables import BaseTable, ToggleColumn
@@ -11,11 +13,15 @@ from .models import MetaDeviceType
 class MetaDeviceTypeTable(BaseTable):
     pk = ToggleColumn(visible=True)
     id = None
+    imported_dt = tables.Column(
+        linkify=True,
+        verbose_name='Device Type'
+    )
 
     def render_name(self, value):
         return '{}'.format(value.split('.')[0])
 
     class Meta(BaseTable.Meta):
         model = MetaDeviceType
-        fields = ('pk', 'name', 'vendor', 'is_new', 'is_imported')
-        default_columns = ('pk', 'name', 'vendor', 'is_imported')
+        fields = ('pk', 'name', 'vendor', 'is_new', 'is_imported', 'imported_dt')
+        default_columns = ('pk', 'name', 'vendor', 'is_imported', 'imported_dt')
@@ -0,0 +1,95 @@
+import io
+import tarfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from netbox_devicetype_importer.utilities import ArchiveRepoAPI, RateLimiter, git_blob_sha, git_tree_sha
+
+
+COMMIT = 'a' * 40
+MODEL = b"manufacturer: Vendor\nmodel: Model 1\nslug: model-1\n"
+
+
+def get_archive():
+    '''
+    tar.gz in the layout of a GitHub tarball, with the commit in the pax header
+    '''
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz', format=tarfile.PAX_FORMAT, pax_headers={'comment': COMMIT}) as tar:
+        for name, data in (('owner-repo-aaaaaaa/README.md', b'readme'),
+                           ('owner-repo-aaaaaaa/device-types/Vendor/Model 1.yaml', MODEL)):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class ArchiveServer():
+    '''
+    Serves the archive, the first failures requests get 503
+    '''
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.requests = 0
+        archive = get_archive()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                if server.requests <= server.failures:
+                    self.send_response(503)
+                    self.send_header('Retry-After', '0')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-gzip')
+                self.send_header('Content-Length', str(len(archive)))
+                self.end_headers()
+                self.wfile.write(archive)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/archive.tar.gz'
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ArchiveRepoAPITestCase(unittest.TestCase):
+    def get_api(self, server, retries):
+        api = ArchiveRepoAPI(source=server.url)
+        api.rate_limiter = RateLimiter(retries=retries, backoff=0, api='archive')
+        return api
+
+    def check_api(self, api):
+        sha = git_blob_sha(MODEL)
+        vendor_oid = git_tree_sha({'Model 1.yaml': ('100644', sha)})
+        root_oid = git_tree_sha({'Vendor': ('40000', vendor_oid)})
+        self.assertEqual(api.pin(), COMMIT)
+        self.assertEqual(api.get_root(), (root_oid, {'Vendor': vendor_oid}))
+        self.assertEqual(api.get_tree(), {'Vendor': {'Model 1.yaml': {'sha': sha}}})
+        self.assertEqual(api.get_files({sha: 'Vendor/Model 1.yaml'}), {sha: MODEL.decode()})
+
+    def test_streamed_archive_with_retries(self):
+        # the body of a streamed response must not be read when it is checked for transient errors
+        server = ArchiveServer()
+        try:
+            self.check_api(self.get_api(server, retries=2))
+            self.assertEqual(server.requests, 1)
+        finally:
+            server.shutdown()
+
+    def test_streamed_archive_after_transient_error(self):
+        server = ArchiveServer(failures=1)
+        try:
+            self.check_api(self.get_api(server, retries=2))
+            self.assertEqual(server.requests, 2)
+        finally:
+            server.shutdown()
@@ -1,10 +1,11 @@
 from django.urls import path
 
 
-from .views import MetaDeviceTypeListView, MetaDeviceTypeLoadView, MetaDeviceTypeImportView
+from .views import MetaDeviceTypeListView, MetaDeviceTypeLoadView, MetaDeviceTypeImportView, MetaDeviceTypeJobView
 
 urlpatterns = [
     path('meta-device-types/', MetaDeviceTypeListView.as_view(), name='metadevicetype_list'),
     path('meta-device-types/load/', MetaDeviceTypeLoadView.as_view(), name='metadevicetype_load'),
-    path('meta-device-types/import/', MetaDeviceTypeImportView.as_view(), name='metadevicetype_import')
+    path('meta-device-types/import/', MetaDeviceTypeImportView.as_view(), name='metadevicetype_import'),
+    path('meta-device-types/jobs/<uuid:job_id>/', MetaDeviceTypeJobView.as_view(), name='metadevicetype_job'),
 ]
@@ -1,9 +1,23 @@
+import hashlib
+import json
+import os
+import random
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from jinja2 import Template
 
+from . import metrics
+
 
-class GQLError(Exception):
+class RepoError(Exception):
     default_message = None
 
     def __init__(self, message=None):
@@ -14,60 +28,347 @@ class GQLError(Exception):
         super().__init__(message)
 
 
-class GitHubAPI():
-    def __init__(self, url=None, token=None, owner=None, repo=None):
+class GQLError(RepoError):
+    pass
+
+
+def git_blob_sha(data):
+    '''
+    sha of the file content the way git computes it for blob objects
+    '''
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def git_tree_sha(entries):
+    '''
+    sha of a tree the way git computes it for tree objects
+    entries = {'name': ('100644', 'sha')}, mode is '40000' for subtrees
+    '''
+    data = b''
+    for name in sorted(entries, key=lambda name: name + '/' if entries[name][0] == '40000' else name):
+        mode, sha = entries[name]
+        data += f'{mode} {name}'.encode() + b'\0' + bytes.fromhex(sha)
+    return hashlib.sha1(b'tree %d\0' % len(data) + data).hexdigest()
+
+
+class RateLimiter():
+    '''
+    Request scheduler for the GitHub APIs.
+    It keeps the remaining rate limit from the X-RateLimit-* headers, spreads requests
+    over the rest of the window when the budget runs low, waits for the reset when it is
+    exhausted, and retries transient failures and secondary rate limits with jittered backoff.
+    One instance is shared by all clients of the process using the same token and API,
+    GitHub sees the budget of all NetBox nodes using the token in the headers.
+    '''
+    transient_statuses = (429, 500, 502, 503, 504)
+    timeout = 60
+
+    def __init__(self, retries=2, backoff=1, max_backoff=60, reserve=100, api='github'):
+        self.api = api
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.reserve = reserve
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.reset = None
+        self.cost = 0
+
+    def get_delay(self, attempt):
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def wait(self):
+        with self.lock:
+            remaining, reset = self.remaining, self.reset
+        if remaining is None or reset is None or remaining >= self.reserve:
+            return
+        window = max(reset - time.time(), 0)
+        if remaining <= 0:
+            time.sleep(window + 1)
+        else:
+            time.sleep(window / remaining)
+
+    def update(self, response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        with self.lock:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset is not None:
+                self.reset = int(reset)
+
+    def add_cost(self, cost):
+        with self.lock:
+            self.cost += cost
+
+    def is_transient(self, response, stream=False):
+        if response.status_code in self.transient_statuses:
+            return True
+        # the body of a streamed response is left to the caller
+        if self.api == 'graphql' and not stream and response.ok and b'RATE_LIMITED' in response.content:
+            # GraphQL reports its rate limit in the body of a 200 response
+            try:
+                errors = response.json().get('errors') or []
+            except ValueError:
+                return False
+            return any(error.get('type') == 'RATE_LIMITED' for error in errors)
+        # secondary rate limit, or the primary one is used up
+        return response.status_code == 403 and (
+            'Retry-After' in response.headers or response.headers.get('X-RateLimit-Remaining') == '0'
+        )
+
+    def get_retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+        if response.headers.get('X-RateLimit-Remaining') == '0' and self.reset:
+            return max(self.reset - time.time(), 0) + 1
+        return self.get_delay(attempt)
+
+    def request(self, session, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.retries + 1):
+            self.wait()
+            started = time.monotonic()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.observe_request(self.api, 'error', 0, time.monotonic() - started)
+                if attempt == self.retries:
+                    raise RepoError(f'Can not connect to GitHub: {e}')
+                time.sleep(self.get_delay(attempt))
+                continue
+            # the body of a streamed response is not read yet
+            if kwargs.get('stream'):
+                size = int(response.headers.get('Content-Length') or 0)
+            else:
+                size = len(response.content)
+            metrics.observe_request(self.api, response.status_code, size, time.monotonic() - started)
+            self.update(response)
+            if attempt < self.retries and self.is_transient(response, stream=kwargs.get('stream', False)):
+                # release the connection of a streamed response which is not read
+                response.close()
+                time.sleep(self.get_retry_delay(response, attempt))
+                continue
+            return response
+
+
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api, token, **kwargs):
+    key = (api, hashlib.sha256((token or '').encode()).hexdigest())
+    with rate_limiters_lock:
+        if key not in rate_limiters:
+            rate_limiters[key] = RateLimiter(api=api, **kwargs)
+        return rate_limiters[key]
+
+
+class RepoAPI():
+    '''
+    Device type library backend.
+    get_root returns ('root_oid', {'vendor': 'vendor_oid'}), or None if the backend can not tell
+    get_tree returns {'vendor': {'model.yaml': {'sha': ''}}}, only for the given vendors if any
+    get_files takes {'sha': 'vendor/model.yaml'} and returns {'sha': 'yaml_text'}, files are read from ref,
+    or from the given commit of the rows they were loaded from
+    ref is the branch or commit the library is read from, pin resolves it to a commit oid
+    cost is the GraphQL cost of the queries made so far
+    '''
+    cost = 0
+    ref = None
+    commit = None
+
+    def get_commit(self):
+        '''
+        Commit oid of ref, None if the backend can not tell
+        '''
+        return None
+
+    def pin(self):
+        '''
+        Resolve ref to a commit once, everything is read from that commit afterwards, so files fetched later
+        match the shas of the tree. Returns the commit oid or None.
+        '''
+        if self.commit is None:
+            self.commit = self.get_commit()
+            if self.commit:
+                self.ref = self.commit
+        return self.commit
+
+    def get_root(self):
+        return None
+
+    def get_tree(self, vendors=None):
+        raise NotImplementedError
+
+    def get_files(self, query_data, ref=None):
+        raise NotImplementedError
+
+
+class EtagCache():
+    '''
+    On-disk cache of GitHub REST API responses for conditional requests.
+    A 304 Not Modified response does not count against the rate limit.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    def get(self, url):
+        try:
+            with open(self.get_path(url)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, url, etag, body):
+        path = self.get_path(url)
+        # other workers may read it at the same time
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'etag': etag, 'body': body}, f)
+        os.replace(tmp_path, path)
+
+
+class GitHubAPI(RepoAPI):
+    '''
+    GitHub REST API client, works without a token within the unauthenticated rate limit.
+    The whole tree is loaded with one recursive git trees call, vendor trees and blobs
+    are fetched concurrently. Trees and blobs are addressed by sha, so cached ones are
+    used without asking GitHub, other responses are revalidated with If-None-Match.
+    '''
+    def __init__(self, url='https://api.github.com', token=None, owner=None, repo=None,
+                 max_workers=4, cache_dir=None, retries=2, ref='master'):
         self.session = requests.session()
         self.session.headers.update({'Accept': 'application/vnd.github.v3+json'})
         if token:
             self.session.headers.update({'Authorization': f'token {token}'})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.dt_dir = 'device-types'
-        self.url = f'https://api.github.com/repos/{owner}/{repo}/contents/'
+        self.url = f'{url}/repos/{owner}/{repo}/'
+        self.ref = ref
+        self.max_workers = max_workers
+        self.etag_cache = EtagCache(cache_dir) if cache_dir else None
+        self.rate_limiter = get_rate_limiter('rest', token, retries=retries)
+        self.root = None
 
-    def get_vendors(self):
-        result = {}
-        url = f'{self.url}{self.dt_dir}'
-        response = self.session.get(url)
-        if response.ok:
-            for vendor in response.json():
-                result[vendor['name']] = vendor['path']
-        return result
+    def get_json(self, path, immutable=False):
+        url = f'{self.url}{path}'
+        cached = self.etag_cache.get(url) if self.etag_cache else None
+        if cached and immutable:
+            return cached['body']
+        headers = {}
+        if cached and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        response = self.rate_limiter.request(self.session, 'GET', url, headers=headers)
+        if response.status_code == 304:
+            return cached['body']
+        try:
+            body = response.json()
+        except ValueError:
+            raise RepoError('Cant parse message from GitHub. {}'.format(response.text))
+        if not response.ok:
+            raise RepoError(f'GitHub API Error: {body.get("message")}')
+        if self.etag_cache:
+            self.etag_cache.set(url, response.headers.get('ETag'), body)
+        return body
+
+    def get_commit(self):
+        response = self.rate_limiter.request(
+            self.session, 'GET', f'{self.url}commits/{self.ref}', headers={'Accept': 'application/vnd.github.sha'}
+        )
+        if not response.ok:
+            raise RepoError(f'GitHub API Error: {self.ref} {response.status_code} {response.reason}')
+        return response.text.strip()
 
-    def get_models(self, vendor):
+    def get_root(self):
+        if self.root is None:
+            root_oid = None
+            # the tree of a pinned commit never changes
+            for entry in self.get_json(f'git/trees/{self.ref}', immutable=self.ref == self.commit)['tree']:
+                if entry['path'] == self.dt_dir and entry['type'] == 'tree':
+                    root_oid = entry['sha']
+            if root_oid is None:
+                raise RepoError(f'{self.dt_dir} not found in the repository')
+            vendors = {
+                entry['path']: entry['sha']
+                for entry in self.get_json(f'git/trees/{root_oid}', immutable=True)['tree'] if entry['type'] == 'tree'
+            }
+            self.root = (root_oid, vendors)
+        return self.root
+
+    def get_models(self, vendor_oid):
         result = {}
-        url = f'{self.url}{self.dt_dir}/{vendor}'
-        response = self.session.get(url)
-        if response.ok:
-            for model in response.json():
-                result[model['name']] = {
-                    'path': model['path'],
-                    'sha': model['sha'],
-                    'download_url': model['download_url']
-                }
+        for model in self.get_json(f'git/trees/{vendor_oid}', immutable=True)['tree']:
+            if model['type'] == 'blob':
+                result[model['path']] = {'sha': model['sha']}
         return result
 
-    def get_tree(self):
+    def get_tree(self, vendors=None):
         '''
         {'cisco': {
-            '2950.yaml': {'path': '', 'sha': '', 'download_url': ''}
+            '2950.yaml': {'sha': ''}
             }
         }
         '''
         result = {}
-        vendors = self.get_vendors()
-        for vendor in vendors:
-            models = self.get_models(vendor)
-            result[vendor] = models
+        root_oid, vendor_oids = self.get_root()
+        if vendors is None:
+            tree = self.get_json(f'git/trees/{root_oid}?recursive=1', immutable=True)
+            if not tree['truncated']:
+                for entry in tree['tree']:
+                    parts = entry['path'].split('/')
+                    if entry['type'] == 'blob' and len(parts) == 2:
+                        result.setdefault(parts[0], {})[parts[1]] = {'sha': entry['sha']}
+                return result
+            # too big for one call
+            vendors = vendor_oids.keys()
+        vendors = [vendor for vendor in vendors if vendor in vendor_oids]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for vendor, models in zip(vendors, executor.map(self.get_models, [vendor_oids[v] for v in vendors])):
+                result[vendor] = models
         return result
 
-    def get_files(self, data):
-        return {}
+    def get_file(self, sha):
+        response = self.rate_limiter.request(
+            self.session, 'GET', f'{self.url}git/blobs/{sha}', headers={'Accept': 'application/vnd.github.v3.raw'}
+        )
+        if response.status_code == 404:
+            return sha, None
+        if not response.ok:
+            raise RepoError(f'GitHub API Error: {response.status_code} {response.reason}')
+        return sha, response.content.decode('utf-8')
+
+    def get_files(self, query_data, ref=None):
+        '''
+        data = {'sha': 'venodor/model'}
+        result = {'sha': 'yaml_text'}
+        Blobs are fetched by sha, so ref does not matter.
+        '''
+        result = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for sha, text in executor.map(self.get_file, query_data):
+                if text is not None:
+                    result[sha] = text
+        return result
 
 
-class GitHubGQLAPI():
+class GitHubGQLAPI(RepoAPI):
     tree_query = """
 {
+  rateLimit {
+    cost
+    remaining
+    resetAt
+  }
   repository(owner: "{{ owner }}", name: "{{ repo }}") {
-    object(expression: "master:{{ path }}") {
+    object(expression: "{{ ref }}:{{ path }}") {
       ... on Tree {
         entries {
           name
@@ -93,13 +394,76 @@ class GitHubGQLAPI():
     }
   }
 }
+"""
+    root_query = """
+{
+  rateLimit {
+    cost
+    remaining
+    resetAt
+  }
+  repository(owner: "{{ owner }}", name: "{{ repo }}") {
+    object(expression: "{{ ref }}:{{ path }}") {
+      oid
+      ... on Tree {
+        entries {
+          name
+          type
+          oid
+        }
+      }
+    }
+  }
+}
+"""
+    commit_query = """
+{
+  rateLimit {
+    cost
+    remaining
+    resetAt
+  }
+  repository(owner: "{{ owner }}", name: "{{ repo }}") {
+    object(expression: "{{ ref }}") {
+      oid
+    }
+  }
+}
+"""
+    vendors_query = """
+{
+    rateLimit {
+        cost
+        remaining
+        resetAt
+    }
+    repository(owner: "{{ owner }}", name: "{{ repo }}") {
+        {% for vendor in vendors %}
+        vendor_{{ loop.index0 }}: object(expression: "{{ ref }}:{{ path }}/{{ vendor }}") {
+            ... on Tree {
+                entries {
+                    name
+                    type
+                    oid
+                }
+            }
+        }
+        {% endfor %}
+    }
+}
 """
     files_query = """
 {
+    rateLimit {
+        cost
+        remaining
+        resetAt
+    }
     repository(owner: "{{ owner }}", name: "{{ repo }}") {
         {% for sha, path in data.items() %}
-        sha_{{ sha }}: object(expression: "master:{{ root_path }}/{{ path }}") {
+        sha_{{ sha }}: object(expression: "{{ ref }}:{{ root_path }}/{{ path }}") {
             ... on Blob {
+                oid
                 text
             }
         }
@@ -108,23 +472,38 @@ class GitHubGQLAPI():
 }
 """
 
-    def __init__(self, url='https://api.github.com/graphql', token=None, owner=None, repo=None):
+    def __init__(self, url='https://api.github.com/graphql', token=None, owner=None, repo=None,
+                 chunk_size=100, max_workers=4, retries=2, ref='master'):
         self.session = requests.session()
         self.session.headers.update({'Authorization': f'token {token}'})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.path = 'device-types'
         self.url = url
         self.token = token
         self.owner = owner
         self.repo = repo
+        self.ref = ref
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.rate_limiter = get_rate_limiter('graphql', token, retries=retries)
+        self.cost = 0
+        self.errors = []
 
     def get_query(self, query):
-        result = {}
-        response = self.session.post(url=self.url, json={'query': query})
+        # transient errors, RATE_LIMITED included, are retried by the rate limiter
+        response = self.rate_limiter.request(self.session, 'POST', self.url, json={'query': query})
         try:
             result = response.json()
         except requests.exceptions.JSONDecodeError:
             raise GQLError('Cant parse message from GitHub. {}'.format(response.text))
         err = result.get('errors')
+        rate_limit = (result.get('data') or {}).get('rateLimit')
+        if rate_limit:
+            self.cost += rate_limit['cost']
+            self.rate_limiter.add_cost(rate_limit['cost'])
+            metrics.graphql_cost.inc(rate_limit['cost'])
         if err:
             # fix that
             raise GQLError(message=err[0].get('message'))
@@ -134,10 +513,28 @@ class GitHubGQLAPI():
             raise GQLError(result.get('message'))
         return result
 
-    def get_tree(self):
+    def get_commit(self):
+        template = Template(self.commit_query)
+        data = self.get_query(template.render(owner=self.owner, repo=self.repo, ref=self.ref))
+        commit = data['data']['repository']['object']
+        if commit is None:
+            raise GQLError(f'{self.ref} not found in the repository')
+        return commit['oid']
+
+    def get_root(self):
+        template = Template(self.root_query)
+        query = template.render(owner=self.owner, repo=self.repo, ref=self.ref, path=self.path)
+        data = self.get_query(query)
+        root = data['data']['repository']['object']
+        vendors = {entry['name']: entry['oid'] for entry in root['entries'] if entry['type'] == 'tree'}
+        return root['oid'], vendors
+
+    def get_tree(self, vendors=None):
         result = {}
+        if vendors is not None:
+            return self.get_vendors_tree(vendors)
         template = Template(self.tree_query)
-        query = template.render(owner=self.owner, repo=self.repo, path=self.path)
+        query = template.render(owner=self.owner, repo=self.repo, ref=self.ref, path=self.path)
         data = self.get_query(query)
         if not data:
             return result
@@ -147,17 +544,358 @@ class GitHubGQLAPI():
                 result[vendor['name']].update({model['name']: {'sha': model['object']['oid']}})
         return result
 
-    def get_files(self, query_data):
+    def get_vendors_tree(self, vendors):
+        result = {}
+        vendors = list(vendors)
+        template = Template(self.vendors_query)
+        for i in range(0, len(vendors), self.chunk_size):
+            chunk = vendors[i:i + self.chunk_size]
+            query = template.render(owner=self.owner, repo=self.repo, ref=self.ref, path=self.path, vendors=chunk)
+            data = self.get_query(query)
+            for key, vendor_tree in data['data']['repository'].items():
+                vendor = chunk[int(key.replace('vendor_', ''))]
+                if vendor_tree is None:
+                    # vendor is gone
+                    continue
+                result[vendor] = {
+                    model['name']: {'sha': model['oid']}
+                    for model in vendor_tree['entries'] if model['type'] == 'blob'
+                }
+        return result
+
+    def get_files(self, query_data, ref=None):
         '''
         data = {'sha': 'venodor/model'}
         result = {'sha': 'yaml_text'}
+        Files are read from ref, the commit the rows were loaded from, or from self.ref.
+        Files are fetched in chunks of chunk_size concurrently, a failed chunk does not fail the others.
+        Errors of failed chunks are kept in self.errors, their files are missing in the result.
         '''
         result = {}
+        self.errors = []
         if not query_data:
             return result
+        items = list(query_data.items())
+        chunks = [dict(items[i:i + self.chunk_size]) for i in range(0, len(items), self.chunk_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.get_files_chunk, chunk, ref or self.ref) for chunk in chunks]
+            for future in as_completed(futures):
+                try:
+                    result.update(future.result())
+                except RepoError as e:
+                    # GraphQL and connection errors lose only the files of the chunk
+                    self.errors.append(e)
+        if self.errors and not result:
+            raise self.errors[0]
+        return result
+
+    def get_files_chunk(self, query_data, ref):
+        result = {}
         template = Template(self.files_query)
-        query = template.render(owner=self.owner, repo=self.repo, data=query_data, root_path=self.path)
+        query = template.render(owner=self.owner, repo=self.repo, ref=ref, data=query_data, root_path=self.path)
         data = self.get_query(query)
         for k, v in data['data']['repository'].items():
-            result[k.replace('sha_', '')] = v['text']
+            sha = k.replace('sha_', '')
+            if v is None or v.get('oid', sha) != sha:
+                # file is gone, or changed since it was loaded
+                continue
+            result[sha] = v['text']
+        return result
+
+
+class LocalRepoAPI(RepoAPI):
+    '''
+    Reads the library from a local devicetype-library checkout, or from a bare repo with git.
+    Shas are git blob shas in both cases, so they match the ones from GitHub.
+    '''
+    def __init__(self, path, ref='HEAD'):
+        self.path = path
+        self.ref = ref
+        self.dt_dir = 'device-types'
+        self.use_git = not os.path.isdir(os.path.join(path, self.dt_dir))
+        self.tree = None
+        if self.use_git and not os.path.isdir(path):
+            raise RepoError(f'Repository path {path} does not exist')
+
+    def get_commit(self):
+        # files of a checkout are read from the working tree
+        if not self.use_git:
+            return None
+        return self.git('rev-parse', '--verify', f'{self.ref}^{{commit}}').decode().strip()
+
+    def git(self, *args, input=None):
+        try:
+            process = subprocess.run(
+                ['git', '--git-dir', self.path, *args], input=input, capture_output=True, check=True
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, 'stderr', None) or b''
+            raise RepoError(f'git {args[0]} failed: {stderr.decode(errors="replace").strip() or e}')
+        return process.stdout
+
+    def get_root(self):
+        if self.use_git:
+            root_oid = self.git('rev-parse', f'{self.ref}:{self.dt_dir}').decode().strip()
+            vendors = {}
+            for entry in self.git('ls-tree', '-z', f'{self.ref}:{self.dt_dir}').split(b'\0'):
+                if not entry:
+                    continue
+                info, name = entry.split(b'\t', 1)
+                _, object_type, sha = info.split()
+                if object_type == b'tree':
+                    vendors[name.decode()] = sha.decode()
+            return root_oid, vendors
+        # a checkout has to be read anyway to get the oids, keep it for get_tree
+        vendors = {}
+        self.tree = self.get_tree()
+        for vendor, models in self.tree.items():
+            vendors[vendor] = git_tree_sha({model: ('100644', data['sha']) for model, data in models.items()})
+        root_oid = git_tree_sha({vendor: ('40000', oid) for vendor, oid in vendors.items()})
+        return root_oid, vendors
+
+    def get_tree(self, vendors=None):
+        if self.use_git:
+            return self.get_git_tree(vendors)
+        if self.tree is not None and vendors is not None:
+            return {vendor: self.tree[vendor] for vendor in vendors if vendor in self.tree}
+        result = {}
+        root = os.path.join(self.path, self.dt_dir)
+        if vendors is None:
+            vendors = os.listdir(root)
+        for vendor in sorted(vendors):
+            vendor_path = os.path.join(root, vendor)
+            if not os.path.isdir(vendor_path):
+                continue
+            result[vendor] = {}
+            for model in sorted(os.listdir(vendor_path)):
+                model_path = os.path.join(vendor_path, model)
+                if not os.path.isfile(model_path):
+                    continue
+                with open(model_path, 'rb') as f:
+                    result[vendor][model] = {'sha': git_blob_sha(f.read())}
+        return result
+
+    def get_git_tree(self, vendors=None):
+        result = {}
+        paths = vendors if vendors is not None else []
+        if vendors is not None and not vendors:
+            return result
+        output = self.git('ls-tree', '-r', '-z', f'{self.ref}:{self.dt_dir}', '--', *paths)
+        for entry in output.split(b'\0'):
+            if not entry:
+                continue
+            info, path = entry.split(b'\t', 1)
+            _, object_type, sha = info.split()
+            parts = path.decode().split('/')
+            if object_type != b'blob' or len(parts) != 2:
+                continue
+            vendor, model = parts
+            result.setdefault(vendor, {})[model] = {'sha': sha.decode()}
         return result
+
+    def get_files(self, query_data, ref=None):
+        '''
+        data = {'sha': 'venodor/model'}
+        result = {'sha': 'yaml_text'}
+        Blobs are read by sha, so ref does not matter.
+        '''
+        result = {}
+        if not query_data:
+            return result
+        if self.use_git:
+            return self.get_git_files(query_data)
+        for sha, path in query_data.items():
+            try:
+                with open(os.path.join(self.path, self.dt_dir, path), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            # the file was changed after Load
+            if git_blob_sha(data) != sha:
+                continue
+            result[sha] = data.decode('utf-8')
+        return result
+
+    def get_git_files(self, query_data):
+        result = {}
+        output = self.git('cat-file', '--batch', input=''.join(f'{sha}\n' for sha in query_data).encode())
+        pos = 0
+        while pos < len(output):
+            header_end = output.index(b'\n', pos)
+            header = output[pos:header_end].split()
+            pos = header_end + 1
+            if len(header) != 3:
+                # <sha> missing
+                continue
+            sha, _, size = header
+            size = int(size)
+            result[sha.decode()] = output[pos:pos + size].decode('utf-8')
+            pos += size + 1
+        return result
+
+
+class ArchiveRepoAPI(RepoAPI):
+    '''
+    Reads the library from a tar archive of the repository, downloaded from GitHub for ref
+    in one request, or read from a local file or URL in source.
+    The archive is streamed, only files under device-types are kept in memory and nothing is
+    unpacked to disk. Blob shas and tree oids are computed the way git does, so they match
+    the ones of the other backends. The commit of the archive is taken from its pax header,
+    git archive and GitHub write it there.
+    '''
+    dt_dir = 'device-types'
+
+    def __init__(self, source=None, url='https://api.github.com', token=None, owner=None, repo=None, ref='master',
+                 retries=2):
+        self.source = source
+        self.session = requests.session()
+        if token and not source:
+            self.session.headers.update({'Authorization': f'token {token}'})
+        self.url = f'{url}/repos/{owner}/{repo}/tarball/'
+        self.ref = ref
+        self.rate_limiter = get_rate_limiter('archive', token, retries=retries)
+        self.tree = None
+        self.blobs = None
+        # ref and commit of the archive in memory, self.ref stays the branch or pinned commit
+        self.loaded_ref = None
+        self.archive_commit = None
+
+    def load(self, ref=None):
+        '''
+        Read the archive of ref, self.ref by default, unless it is in memory already
+        '''
+        ref = ref or self.ref
+        if self.tree is not None and (self.source or ref in (self.loaded_ref, self.archive_commit)):
+            return
+        self.archive_commit = None
+        if self.source and not self.source.startswith(('http://', 'https://')):
+            try:
+                with open(self.source, 'rb') as f:
+                    files = self.read(f)
+            except OSError as e:
+                raise RepoError(f'Can not read the repository archive: {e}')
+        else:
+            url = self.source or f'{self.url}{ref}'
+            response = self.rate_limiter.request(self.session, 'GET', url, stream=True)
+            if not response.ok:
+                raise RepoError(f'Can not download the repository archive: {response.status_code} {response.reason}')
+            response.raw.decode_content = True
+            try:
+                files = self.read(response.raw)
+            finally:
+                response.close()
+        self.build(files)
+        self.loaded_ref = ref
+
+    def read(self, fileobj):
+        '''
+        returns {'vendor/model.yaml': ('mode', data)} for files under device-types
+        '''
+        files = {}
+        try:
+            with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+                for member in archive:
+                    parts = member.name.strip('/').split('/')
+                    # GitHub archives have a <owner>-<repo>-<sha> directory on top, git archive has none
+                    if parts[0] == self.dt_dir:
+                        parts = parts[1:]
+                    elif len(parts) > 1 and parts[1] == self.dt_dir:
+                        parts = parts[2:]
+                    else:
+                        continue
+                    if not parts:
+                        continue
+                    if member.isfile():
+                        mode = '100755' if member.mode & 0o111 else '100644'
+                        files['/'.join(parts)] = (mode, archive.extractfile(member).read())
+                    elif member.issym():
+                        files['/'.join(parts)] = ('120000', member.linkname.encode())
+                commit = archive.pax_headers.get('comment', '')
+        except (tarfile.TarError, EOFError, OSError) as e:
+            raise RepoError(f'Can not read the repository archive: {e}')
+        if not files:
+            raise RepoError(f'{self.dt_dir} not found in the repository archive')
+        if len(commit) == 40 and all(c in '0123456789abcdef' for c in commit):
+            self.archive_commit = commit
+        return files
+
+    def build(self, files):
+        '''
+        self.tree = {'name': ('mode', 'sha') or {subtree}}
+        self.blobs = {'sha': 'yaml_text'} of device type files
+        '''
+        tree = {}
+        blobs = {}
+        for path, (mode, data) in files.items():
+            *dirs, name = path.split('/')
+            node = tree
+            for directory in dirs:
+                node = node.setdefault(directory, {})
+            sha = git_blob_sha(data)
+            node[name] = (mode, sha)
+            if len(dirs) == 1 and mode != '120000':
+                blobs[sha] = data.decode('utf-8', errors='replace')
+        self.tree = tree
+        self.blobs = blobs
+
+    def get_commit(self):
+        self.load()
+        return self.archive_commit
+
+    def get_oid(self, node):
+        return git_tree_sha({
+            name: ('40000', self.get_oid(entry)) if isinstance(entry, dict) else entry for name, entry in node.items()
+        })
+
+    def get_root(self):
+        self.load()
+        vendors = {name: self.get_oid(node) for name, node in self.tree.items() if isinstance(node, dict)}
+        return self.get_oid(self.tree), vendors
+
+    def get_tree(self, vendors=None):
+        self.load()
+        result = {}
+        for vendor, node in self.tree.items():
+            if not isinstance(node, dict) or (vendors is not None and vendor not in vendors):
+                continue
+            result[vendor] = {
+                name: {'sha': entry[1]} for name, entry in node.items()
+                if not isinstance(entry, dict) and entry[0] != '120000'
+            }
+        return result
+
+    def get_files(self, query_data, ref=None):
+        # rows loaded from another commit are read from the archive of that commit
+        self.load(ref)
+        return {sha: self.blobs[sha] for sha in query_data if sha in self.blobs}
+
+
+class BulkRepoAPI(RepoAPI):
+    '''
+    gh_api, but files are read from the repository archive when threshold or more of them are fetched at once
+    '''
+    def __init__(self, gh_api, archive_api, threshold):
+        self.gh_api = gh_api
+        self.archive_api = archive_api
+        self.threshold = threshold
+
+    @property
+    def cost(self):
+        return self.gh_api.cost
+
+    def pin(self):
+        self.commit = self.gh_api.pin()
+        if self.commit:
+            self.ref = self.archive_api.ref = self.commit
+        return self.commit
+
+    def get_root(self):
+        return self.gh_api.get_root()
+
+    def get_tree(self, vendors=None):
+        return self.gh_api.get_tree(vendors=vendors)
+
+    def get_files(self, query_data, ref=None):
+        if len(query_data) >= self.threshold:
+            return self.archive_api.get_files(query_data, ref=ref or self.commit)
+        return self.gh_api.get_files(query_data, ref=ref)